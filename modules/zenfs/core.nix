@@ -13,6 +13,12 @@ in
 {
   options.zenos.fs = {
     enable = mkEnableOption "ZenFS Standard Directory Structure";
+
+    # Long-lived D-Bus notification broker used by all ZenFS daemons
+    notifyBroker = mkOption {
+      type = types.bool;
+      default = true;
+    };
   };
 
   config = mkIf cfg.enable {
@@ -33,5 +39,15 @@ in
       # Symlink compatibility for standard XDG folders if needed
       # "L+ /home/user/Music - - - - /System/ZenFS/Audio/Music"
     ];
+
+    systemd.services.zenfs-notifyd = mkIf cfg.notifyBroker {
+      description = "ZenFS Notification Broker";
+      wantedBy = [ "multi-user.target" ];
+      serviceConfig = {
+        ExecStart = "${pkgs.zenfs-core}/bin/zenfs-notifyd";
+        User = "root";
+        Restart = "on-failure";
+      };
+    };
   };
 }
@@ -23,6 +23,11 @@ let
         music_dir = cfg.music.musicDir;
         unsafe_wipe = cfg.music.unsafeWipe;
       };
+      duplicates = {
+        scan_dirs = cfg.duplicates.scanDirs;
+        min_size = cfg.duplicates.minSize;
+        suggestions_db = cfg.duplicates.suggestionsDb;
+      };
     }
   );
 in
@@ -36,6 +41,11 @@ in
         type = types.int;
         default = 600;
       };
+      daemon = mkOption {
+        type = types.bool;
+        default = false;
+        description = "Watch the directories and sort each file as its grace period ends, instead of a full rescan every 10 minutes.";
+      };
       watchedDirs = mkOption {
         type = types.listOf types.str;
         default = [ ];
@@ -57,6 +67,24 @@ in
         default = false;
       };
     };
+
+    duplicates = {
+      enable = mkEnableOption "Exact duplicate finder";
+      scanDirs = mkOption {
+        type = types.listOf types.str;
+        default = [ ];
+      };
+      minSize = mkOption {
+        type = types.int;
+        default = 1048576;
+        description = "Files smaller than this (in bytes) are not reported.";
+      };
+      suggestionsDb = mkOption {
+        type = types.str;
+        default = "/var/lib/zenfs/janitor/suggestions.db";
+        description = "Suggestions store the duplicates are written to (shared with the Oracle when it points at the same file).";
+      };
+    };
   };
 
   config = mkIf cfg.enable {
@@ -67,12 +95,15 @@ in
         # Set PYTHONPATH to the root of the source so imports like 'from core import ...' work
         Environment = "PYTHONPATH=${zenfsPackage}/libexec/zenfs";
 
-        # Call the specific script
-        ExecStart = "${pkgs.python3}/bin/python3 ${zenfsPackage}/libexec/zenfs/janitor/dumb.py --config=${janitorConfig}";
+        # The wrapped binary carries watchdog, which the sorter now imports
+        ExecStart =
+          "${zenfsPackage}/bin/zenfs-janitor-dumb --config=${janitorConfig}"
+          + optionalString cfg.dumb.daemon " --daemon";
 
         User = "root";
         Restart = "on-failure";
       };
+      wantedBy = mkIf cfg.dumb.daemon [ "multi-user.target" ];
     };
 
     # 2. Music Organizer Service
@@ -85,8 +116,20 @@ in
       };
     };
 
-    # 3. Timers
-    systemd.timers.zenfs-janitor-dumb = mkIf cfg.dumb.enable {
+    # 3. Duplicate Finder Service
+    systemd.services.zenfs-janitor-duplicates = mkIf cfg.duplicates.enable {
+      description = "ZenFS Janitor (Duplicate Finder)";
+      serviceConfig = {
+        Environment = "PYTHONPATH=${zenfsPackage}/libexec/zenfs";
+        ExecStart = "${zenfsPackage}/bin/zenfs-janitor-duplicates --config=${janitorConfig}";
+        User = "root";
+        Nice = 10;
+        IOSchedulingClass = "idle";
+      };
+    };
+
+    # 4. Timers
+    systemd.timers.zenfs-janitor-dumb = mkIf (cfg.dumb.enable && !cfg.dumb.daemon) {
       wantedBy = [ "timers.target" ];
       timerConfig = {
         OnBootSec = "5m";
@@ -101,5 +144,13 @@ in
         OnUnitActiveSec = "1h";
       };
     };
+
+    systemd.timers.zenfs-janitor-duplicates = mkIf cfg.duplicates.enable {
+      wantedBy = [ "timers.target" ];
+      timerConfig = {
+        OnBootSec = "30m";
+        OnUnitActiveSec = "1d";
+      };
+    };
   };
 }
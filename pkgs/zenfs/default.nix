@@ -12,6 +12,7 @@ let
     ps.watchdog
     ps.pyyaml
     ps.pillow
+    ps.numpy
     ps.mutagen
     ps.psutil
   ]);
@@ -48,11 +49,14 @@ stdenv.mkDerivation {
     wrapScript "janitor/dumb.py" "zenfs-janitor-dumb"
     wrapScript "janitor/music.py" "zenfs-janitor-music"
     wrapScript "janitor/ml.py" "zenfs-janitor-ml"
+    wrapScript "janitor/duplicates.py" "zenfs-janitor-duplicates"
     wrapScript "core/offloader.py" "zenfs-offloader"
     wrapScript "core/mounting.py" "zenfs-gatekeeper"
     wrapScript "core/indexer.py" "zenfs-indexer"
     wrapScript "core/roaming.py" "zenfs-roaming"
     wrapScript "user/mint.py" "zenfs-mint"
+    wrapScript "core/notifyd.py" "zenfs-notifyd"
+    # bench/ stays in libexec only: run benchmarks as `python bench/<script>.py`
 
     runHook postInstall
   '';
@@ -0,0 +1,88 @@
+######
+# scripts/bench/image_dims.py
+######
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../janitor'))
+import imagesize
+
+# Header parser vs Pillow for reading image dimensions, the Oracle's hot path.
+# Needs Pillow, both for the comparison and to generate the sample set.
+
+# [ CONSTANTS ]
+FORMATS = {"png": "PNG", "jpg": "JPEG", "webp": "WEBP", "gif": "GIF"}
+SIZES = [(1920, 1080), (1080, 1920), (4032, 3024), (640, 480), (800, 800)]
+
+def generate(base, count, seed):
+    from PIL import Image
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        ext = rng.choice(list(FORMATS))
+        w, h = rng.choice(SIZES)
+        img = Image.new("RGB", (w // 8, h // 8), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        img = img.resize((w, h))
+        path = os.path.join(base, f"img_{i}.{ext}")
+        kwargs = {"exif": Image.Exif().tobytes()} if ext == "jpg" else {}
+        img.save(path, FORMATS[ext], **kwargs)
+        paths.append(path)
+    return paths
+
+def timed(func, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(p) for p in paths]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Image dimension reader benchmark (header parser vs Pillow)")
+    parser.add_argument("--dir", help="Benchmark the images in this directory instead of generated ones")
+    parser.add_argument("--count", type=int, default=200, help="Generated images")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Import cost is part of what the header parser saves
+    start = time.perf_counter()
+    from PIL import Image
+    pillow_import_ms = (time.perf_counter() - start) * 1000
+
+    base = None
+    if args.dir:
+        paths = [os.path.join(args.dir, n) for n in sorted(os.listdir(args.dir))
+                 if os.path.splitext(n)[1].lower().lstrip('.') in ("png", "jpg", "jpeg", "webp", "gif")]
+    else:
+        base = tempfile.mkdtemp(prefix="zenfs_imgbench_")
+        paths = generate(base, args.count, args.seed)
+
+    try:
+        header_s, header = timed(imagesize.read_dimensions, paths, args.repeat)
+        pillow_s, pillow = timed(imagesize.pillow_dimensions, paths, args.repeat)
+    finally:
+        if base: shutil.rmtree(base, ignore_errors=True)
+
+    mismatches = [p for p, a, b in zip(paths, header, pillow) if a is not None and tuple(a) != tuple(b or ())]
+    report = {
+        "files": len(paths),
+        "pillow_import_ms": round(pillow_import_ms, 2),
+        "header_us_per_file": round(header_s / max(1, len(paths)) * 1e6, 2),
+        "pillow_us_per_file": round(pillow_s / max(1, len(paths)) * 1e6, 2),
+        "speedup": round(pillow_s / header_s, 1) if header_s else None,
+        "header_misses": sum(1 for a in header if a is None),
+        "mismatches": mismatches[:10],
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
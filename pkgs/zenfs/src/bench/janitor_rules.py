@@ -0,0 +1,109 @@
+######
+# scripts/bench/janitor_rules.py
+######
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../janitor'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
+import rules
+from dumb import get_destination
+
+# Micro-benchmark: classic linear get_destination vs the compiled RuleSet,
+# on names only and on a real directory listing with size/age rules.
+
+# [ CONSTANTS ]
+EXTENSIONS = [
+    "jpg", "png", "gif", "webp", "mp4", "mkv", "mp3", "flac", "pdf", "docx",
+    "xlsx", "zip", "tar", "gz", "iso", "deb", "py", "rs", "txt", "md", "blend", "stl"
+]
+
+def generate_rules(folders, per_folder, seed):
+    """Classic {folder: [ext, ...]} rules, the shape the Nix module writes."""
+    rng = random.Random(seed)
+    pool = EXTENSIONS + [f"x{i:03d}" for i in range(folders * per_folder)]
+    rng.shuffle(pool)
+    return {f"Folder{i}": pool[i * per_folder:(i + 1) * per_folder] for i in range(folders)}
+
+def generate_names(count, seed):
+    rng = random.Random(seed)
+    exts = EXTENSIONS + ["unknown", "bin", ""]
+    names = []
+    for i in range(count):
+        ext = rng.choice(exts)
+        stem = rng.choice(["Screenshot_", "IMG_", "scr_", "report-", "file"]) + str(i)
+        names.append(f"{stem}.{ext}" if ext else stem)
+    return names
+
+def rich_rules(classic):
+    out = {
+        "Screenshots": [{"glob": "Screenshot_*.png"}, {"regex": r"^scr_\d+"}],
+        "Installers": {"extensions": ["iso", "deb"], "min_size": "1M"},
+    }
+    out.update(classic)
+    out["Stale"] = {"min_age": 30 * 86400}
+    return out
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="ZenFS Dumb Janitor rule engine micro-benchmark")
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--folders", type=int, default=20)
+    parser.add_argument("--per-folder", type=int, default=15, help="Extensions per rule folder")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--listing", type=int, default=5000, help="Files created on disk for the batch test (0 to skip)")
+    args = parser.parse_args()
+
+    classic = generate_rules(args.folders, args.per_folder, args.seed)
+    names = generate_names(args.files, args.seed)
+    report = {"files": args.files, "rule_folders": args.folders, "extensions_per_folder": args.per_folder}
+
+    start = time.perf_counter()
+    ruleset = rules.RuleSet(classic)
+    report["compile_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    linear, expected = timed(lambda: [get_destination(os.path.splitext(n)[1], classic) for n in names], args.repeat)
+    compiled, got = timed(lambda: [ruleset.classify(n) for n in names], args.repeat)
+    if got != expected:
+        print("Error: compiled rules disagree with get_destination", file=sys.stderr)
+        sys.exit(1)
+    report["linear_us_per_file"] = round(linear / args.files * 1e6, 3)
+    report["compiled_us_per_file"] = round(compiled / args.files * 1e6, 3)
+    report["speedup"] = round(linear / compiled, 1) if compiled else None
+
+    if args.listing:
+        base = tempfile.mkdtemp(prefix="zenfs_rules_")
+        try:
+            for name in generate_names(args.listing, args.seed + 1):
+                with open(os.path.join(base, name), 'w') as f:
+                    f.write("x")
+            rich = rules.RuleSet(rich_rules(classic))
+            def batch():
+                with os.scandir(base) as it:
+                    return rich.classify_batch(list(it))
+            elapsed, results = timed(batch, args.repeat)
+            report["batch_listing_files"] = args.listing
+            report["batch_us_per_file"] = round(elapsed / args.listing * 1e6, 3)
+            report["batch_matched"] = sum(1 for _, folder in results if folder)
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+######
+# scripts/bench/offloader_sim.py
+######
+import os
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
+import offloader
+import transfer
+import dedup
+import rehydrate
+
+# [ CONSTANTS ]
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+WRITE_CHUNK = 1024 * 1024
+
+def parse_size(value):
+    if isinstance(value, (int, float)): return int(value)
+    value = value.strip().upper()
+    if value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+class Event:
+    """Minimal stand-in for a watchdog event."""
+    def __init__(self, src_path):
+        self.src_path = src_path
+        self.is_directory = False
+
+class SimEnv:
+    """
+    Temporary WATCH_ROOT / ROAMING_ROOT pair with size-limited drives.
+    Backend "tmpfs" or "loop" mounts real filesystems (root only); "dir" uses
+    plain directories and enforces capacities through a disk_usage shim.
+    Usage comes from byte counters the harness updates on every simulated
+    write, transfer and restore, so lookups do not walk the tree.
+    """
+    def __init__(self, drive_sizes, root_size, base_percent, backend):
+        self.base = tempfile.mkdtemp(prefix="zenfs_sim_")
+        self.watch_root = os.path.join(self.base, "Users")
+        self.roaming_root = os.path.join(self.base, "Roaming")
+        self.root_size = root_size
+        self.base_percent = base_percent
+        self.backend = backend
+        self.drives = {}
+        self.mounts = []
+        self.local_bytes = 0
+        self.drive_bytes = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.watch_root)
+        for i, size in enumerate(drive_sizes):
+            path = os.path.join(self.roaming_root, f"sim-drive-{i}")
+            os.makedirs(path)
+            self._attach(path, size)
+            os.makedirs(os.path.join(path, "Users"), exist_ok=True)
+            self.drives[path] = size
+            self.drive_bytes[path] = 0
+
+    def _attach(self, path, size):
+        if self.backend == "tmpfs":
+            subprocess.check_call(["mount", "-t", "tmpfs", "-o", f"size={size}", "tmpfs", path])
+            self.mounts.append(path)
+        elif self.backend == "loop":
+            image = path + ".img"
+            with open(image, 'wb') as f:
+                f.truncate(size)
+            subprocess.check_call(["mkfs.ext4", "-q", "-F", image], stdout=subprocess.DEVNULL)
+            subprocess.check_call(["mount", "-o", "loop", image, path])
+            self.mounts.append(path)
+
+    def tree_bytes(self, root):
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                try: total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError: pass
+        return total
+
+    def drive_of(self, path):
+        for drive in self.drives:
+            if path == drive or path.startswith(drive + os.sep):
+                return drive
+        return None
+
+    def wrote(self, delta):
+        """Bytes the workload added under WATCH_ROOT."""
+        with self.lock:
+            self.local_bytes += delta
+
+    def settle(self, key, drive, size):
+        """Accounts a finished transfer of key (file or tree unit): local -> drive, unless it was a dedup link."""
+        if not os.path.islink(key):
+            return  # Vanished or kept local
+        dest = os.path.join(drive, "Users", os.path.relpath(key, self.watch_root))
+        copied = os.path.realpath(key) == os.path.realpath(dest)
+        with self.lock:
+            self.local_bytes -= size
+            if copied:
+                self.drive_bytes[drive] += size
+
+    def track_restores(self, worker):
+        """Wraps worker.restore so rehydrated bytes move back from the drive counters."""
+        restore = worker.restore
+        def counted_restore(target):
+            try: size = os.path.getsize(target)
+            except OSError: size = 0
+            restored = restore(target)
+            drive = self.drive_of(target)
+            with self.lock:
+                self.local_bytes += restored
+                if restored and drive and not os.path.exists(target):
+                    self.drive_bytes[drive] -= size
+            return restored
+        worker.restore = counted_restore
+
+    def root_usage(self):
+        """Fake root usage: base load plus whatever still lives under WATCH_ROOT."""
+        return self.base_percent + self.local_bytes / self.root_size * 100
+
+    def disk_usage(self, path):
+        drive = self.drive_of(path)
+        if drive:
+            size = self.drives[drive]
+            used = self.drive_bytes[drive]
+            return shutil._ntuple_diskusage(size, used, max(0, size - used))
+        return shutil.disk_usage(path)
+
+    def install(self, use_lsof):
+        offloader.WATCH_ROOT = self.watch_root
+        offloader.ROAMING_ROOT = self.roaming_root
+        offloader.get_disk_usage = lambda path="/": self.root_usage()
+        offloader.ledgers = rehydrate.Ledgers(self.roaming_root)
+        if not use_lsof:
+            offloader.is_file_open = lambda path: False
+        if self.backend == "dir":
+            shim = types.SimpleNamespace(**{k: getattr(shutil, k) for k in dir(shutil) if not k.startswith('__')})
+            shim.disk_usage = self.disk_usage
+            offloader.shutil = shim
+
+    def cleanup(self):
+        for path in self.mounts:
+            subprocess.call(["umount", path])
+        shutil.rmtree(self.base, ignore_errors=True)
+
+def generate_workload(seed, files, users, max_size, duration):
+    """Reproducible mix of creations, growths (downloads) and opens."""
+    rng = random.Random(seed)
+    ops = []
+    created = []
+    for i in range(files):
+        at = rng.uniform(0, duration)
+        user = f"user{rng.randrange(users)}"
+        folder = rng.choice(["Downloads", "Videos", "Projects", "Documents"])
+        path = f"{user}/{folder}/file_{i}.bin"
+        # Heavy tail: most files are small, a few are huge
+        size = min(max_size, int(rng.paretovariate(1.2) * 64 * 1024))
+        ops.append({"at": at, "op": "create", "path": path, "size": size})
+        created.append((at, path))
+        if rng.random() < 0.2:
+            ops.append({"at": at + rng.uniform(0.1, 1.0), "op": "grow", "path": path, "size": size // 2})
+    for _ in range(files // 4):
+        at, path = rng.choice(created)
+        ops.append({"at": at + rng.uniform(1.0, duration), "op": "open", "path": path})
+    ops.sort(key=lambda o: o["at"])
+    return ops
+
+class Recorder:
+    """Wraps scheduler submissions to capture per-transfer timings."""
+    def __init__(self, env):
+        self.env = env
+        self.records = {}
+
+    def wrap(self, scheduler):
+        submit = scheduler.submit
+        def timed_submit(device, key, size, func, callback=None):
+            rec = {"drive": device, "size": size, "submitted": time.monotonic()}
+            self.records[key] = rec
+            def timed_func(bucket):
+                rec["started"] = time.monotonic()
+                ok = func(bucket)
+                rec["finished"] = time.monotonic()
+                rec["ok"] = ok and ok != offloader.PER_FILE  # Handed back to the file queue: nothing moved
+                if ok:
+                    self.env.settle(key, device, size)
+                return ok
+            return submit(device, key, size, timed_func, callback)
+        scheduler.submit = timed_submit
+
+def apply_op(env, handler, op, tracker):
+    path = os.path.join(env.watch_root, op["path"])
+    kind = op["op"]
+    if kind == "create":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced = os.path.getsize(path) if os.path.isfile(path) and not os.path.islink(path) else 0
+        write_bytes(path, parse_size(op["size"]), "wb")
+        env.wrote(parse_size(op["size"]) - replaced)
+        handler.on_created(Event(path))
+    elif kind == "tree":
+        # Many small files at once, e.g. a game install or dataset
+        per_file = parse_size(op["size"]) // max(1, op["files"])
+        for i in range(op["files"]):
+            file_path = os.path.join(path, f"d{i % 32}", f"f{i}.dat")
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            write_bytes(file_path, per_file, "wb")
+            env.wrote(per_file)
+            handler.on_created(Event(file_path))
+    elif kind == "grow":
+        if os.path.isfile(path) and not os.path.islink(path):
+            write_bytes(path, parse_size(op["size"]), "ab")
+            env.wrote(parse_size(op["size"]))
+            handler.on_modified(Event(path))
+    elif kind == "open":
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                f.read(WRITE_CHUNK)
+            if tracker and os.path.islink(path):
+                tracker.record(os.path.realpath(path))
+
+def write_bytes(path, size, mode):
+    block = os.urandom(min(size, WRITE_CHUNK)) if size else b""
+    with open(path, mode) as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+def replay(env, ops, args):
+    config = offloader.load_config() if args.config else {}
+    offloader.scheduler = transfer.TransferScheduler(config.get("transfers"))
+    offloader.DIR_OFFLOAD.update(config.get("directories", {}))
+    offloader.deduplicator = dedup.Deduplicator() if args.dedup else None
+    offloader.tracker = None
+    worker = None
+    if args.rehydrate:
+        cfg = dict(rehydrate.DEFAULTS)
+        cfg.update(config.get("rehydrate", {}))
+        cfg["below_percent"] = cfg["below_percent"] or offloader.THRESHOLD_PERCENT - 10
+        offloader.tracker = rehydrate.AccessTracker(cfg["window"], cfg["min_hits"])
+        worker = rehydrate.Rehydrator(
+            offloader.tracker, cfg, offloader.get_disk_usage, offloader.is_file_open, ledgers=offloader.ledgers
+        )
+        env.track_restores(worker)
+
+    recorder = Recorder(env)
+    recorder.wrap(offloader.scheduler)
+    handler = offloader.NewFileHandler()
+
+    cpu_start = time.process_time()
+    harness_cpu = 0.0  # Main-thread CPU spent writing the workload, not offloading it
+    wall_start = time.monotonic()
+    pending_ops = list(ops)
+    deadline = wall_start + args.timeout
+    while time.monotonic() < deadline:
+        elapsed = (time.monotonic() - wall_start) * args.speed
+        while pending_ops and pending_ops[0]["at"] <= elapsed:
+            op_start = time.thread_time()
+            apply_op(env, handler, pending_ops.pop(0), offloader.tracker)
+            harness_cpu += time.thread_time() - op_start
+        offloader.process_queue()
+        offloader.process_dirs()
+        if worker:
+            worker.run_once()
+        with offloader.queue_lock:
+            busy = bool(offloader.in_flight or offloader.pending_dirs)
+        if not pending_ops and not busy:
+            break
+        time.sleep(args.tick)
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start - harness_cpu
+    offloader.scheduler.shutdown()
+    return recorder, wall, cpu
+
+def report(env, recorder, wall, cpu):
+    done = [r for r in recorder.records.values() if r.get("ok")]
+    moved = sum(r["size"] for r in done)
+    waits = [r["started"] - r["submitted"] for r in done]
+    spans = [r["finished"] - r["submitted"] for r in done]
+    per_drive = {}
+    for drive, size in env.drives.items():
+        used = env.tree_bytes(os.path.join(drive, "Users"))
+        per_drive[os.path.basename(drive)] = {"bytes": used, "percent": used / size * 100}
+    percents = [d["percent"] for d in per_drive.values()]
+    gb = moved / UNITS["G"]
+
+    def pct(values, q):
+        if not values: return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "wall_seconds": wall,
+        "transfers": len(done),
+        "failed_attempts": len(recorder.records) - len(done),
+        "offloaded_bytes": moved,
+        "throughput_mb_s": moved / UNITS["M"] / wall if wall else 0.0,
+        "queue_latency_s": {"p50": pct(waits, 0.5), "p95": pct(waits, 0.95), "max": max(waits, default=0.0)},
+        "completion_latency_s": {"p50": pct(spans, 0.5), "p95": pct(spans, 0.95), "max": max(spans, default=0.0)},
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_gb": cpu / gb if gb else 0.0,
+        "final_root_usage_percent": env.root_usage(),
+        "placement": per_drive,
+        "placement_spread_percent": (max(percents) - min(percents)) if percents else 0.0,
+        "placement_stdev_percent": statistics.pstdev(percents) if len(percents) > 1 else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="ZenFS Offloader simulation and throughput benchmark")
+    parser.add_argument("--workload", help="JSON list of {at, op, path, size[, files]} ops (default: generated)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0, help="Workload span in simulated seconds")
+    parser.add_argument("--max-size", default="256M")
+    parser.add_argument("--drives", default="1G,1G,512M", help="Comma separated drive capacities")
+    parser.add_argument("--root-size", default="2G", help="Fake root capacity used for the usage percentage")
+    parser.add_argument("--base-percent", type=float, default=78.0, help="Fake root usage before the workload")
+    parser.add_argument("--backend", choices=["dir", "tmpfs", "loop"], default="dir")
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per wall second")
+    parser.add_argument("--tick", type=float, default=0.1, help="Seconds between queue passes")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--config", help="Offloader JSON config (transfers/dedup/rehydrate sections)")
+    parser.add_argument("--dedup", action="store_true")
+    parser.add_argument("--rehydrate", action="store_true")
+    parser.add_argument("--lsof", action="store_true", help="Use the real lsof busy check")
+    parser.add_argument("--keep", action="store_true", help="Keep the temp tree for inspection")
+    args = parser.parse_args()
+
+    if args.backend != "dir" and os.geteuid() != 0:
+        print(f"Error: --backend {args.backend} needs root. Use --backend dir instead.")
+        sys.exit(1)
+    if args.config:
+        offloader.OFFLOADER_CONFIG = args.config
+
+    if args.workload:
+        with open(args.workload, 'r') as f:
+            ops = sorted(json.load(f), key=lambda o: o["at"])
+    else:
+        ops = generate_workload(args.seed, args.files, args.users, parse_size(args.max_size), args.duration)
+
+    env = SimEnv(
+        [parse_size(s) for s in args.drives.split(",")],
+        parse_size(args.root_size), args.base_percent, args.backend
+    )
+    try:
+        env.install(args.lsof)
+        recorder, wall, cpu = replay(env, ops, args)
+        print(json.dumps(report(env, recorder, wall, cpu), indent=2))
+    finally:
+        if args.keep:
+            print(f"[Sim] Tree kept at {env.base}")
+        else:
+            env.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+######
+# scripts/core/blockdev.py
+######
+import os
+import json
+import hashlib
+import threading
+import subprocess
+
+# [ CONSTANTS ]
+SYS_BLOCK = "/sys/block"
+SYS_CLASS_BLOCK = "/sys/class/block"
+UDEV_DATA = "/run/udev/data"
+MOUNTINFO = "/proc/self/mountinfo"
+SECTOR = 512
+
+# [ STATE ]
+_cache = None          # (signature, devices)
+_cache_lock = threading.Lock()
+
+def _read(path, default=None):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def human_size(num_bytes):
+    """lsblk style size string (1024 based, one decimal when needed)."""
+    value = float(num_bytes)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if value < 1024 or unit == "P":
+            if unit == "B" or value == int(value):
+                return f"{int(value)}{unit}"
+            return f"{value:.1f}{unit}"
+        value /= 1024
+
+def _unescape(value):
+    """mountinfo and udev escape spaces and friends as \\ooo / \\xHH."""
+    if "\\" not in value:
+        return value
+    try:
+        return value.encode('latin-1').decode('unicode_escape').encode('latin-1').decode('utf-8', errors='replace')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return value
+
+def read_mounts():
+    """
+    major:minor and /dev node -> first mountpoint, from /proc/self/mountinfo.
+    btrfs and other filesystems with anonymous device numbers report 0:N as
+    major:minor, so the mount source (resolved to its /dev node) is indexed too.
+    """
+    mounts = {}
+    try:
+        with open(MOUNTINFO, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 5: continue
+                mountpoint = _unescape(fields[4])
+                mounts.setdefault(fields[2], mountpoint)
+                try:
+                    source = fields[fields.index("-", 5) + 2]
+                except (ValueError, IndexError):
+                    continue
+                if source.startswith("/dev/"):
+                    mounts.setdefault(os.path.realpath(_unescape(source)), mountpoint)
+    except OSError:
+        pass
+    return mounts
+
+def read_udev(devnum):
+    """Properties (E: lines) from the udev database for b<major>:<minor>."""
+    props = {}
+    try:
+        with open(os.path.join(UDEV_DATA, f"b{devnum}"), 'r') as f:
+            for line in f:
+                if line.startswith("E:"):
+                    key, _, value = line[2:].rstrip("\n").partition("=")
+                    props[key] = value
+    except OSError:
+        pass
+    return props
+
+def _transport(sys_path, props):
+    real = os.path.realpath(sys_path)
+    if "/usb" in real: return "usb"
+    if "/nvme" in real: return "nvme"
+    bus = props.get("ID_BUS")
+    if bus == "ata": return "sata"
+    return bus
+
+def _node(name, sys_path, mounts, parent_model=None, parent_tran=None):
+    devnum = _read(os.path.join(sys_path, "dev"), "")
+    props = read_udev(devnum) if devnum else {}
+    sectors = _read(os.path.join(sys_path, "size"), "0")
+    label = props.get("ID_FS_LABEL_ENC")
+    label = _unescape(label) if label else props.get("ID_FS_LABEL")
+    is_partition = os.path.exists(os.path.join(sys_path, "partition"))
+    model = None
+    tran = None
+    if not is_partition:
+        model = _read(os.path.join(sys_path, "device/model")) or props.get("ID_MODEL")
+        tran = _transport(sys_path, props)
+    return {
+        "name": name,
+        "uuid": props.get("ID_FS_UUID") or None,
+        "label": label or None,
+        "fstype": props.get("ID_FS_TYPE") or None,
+        "mountpoint": mounts.get(devnum) or mounts.get(f"/dev/{name}"),
+        "size": human_size(int(sectors or 0) * SECTOR),
+        "model": model,
+        "tran": tran,
+        "children": []
+    }
+
+def _scan_sysfs():
+    mounts = read_mounts()
+    devices = []
+    for disk in sorted(os.listdir(SYS_BLOCK)):
+        disk_path = os.path.join(SYS_BLOCK, disk)
+        node = _node(disk, disk_path, mounts)
+        try:
+            entries = sorted(os.listdir(disk_path))
+        except OSError:
+            entries = []
+        for entry in entries:
+            part_path = os.path.join(disk_path, entry)
+            if os.path.exists(os.path.join(part_path, "partition")):
+                node["children"].append(_node(entry, part_path, mounts))
+        if not node["children"]:
+            del node["children"]
+        devices.append(node)
+    return devices
+
+def _scan_lsblk():
+    """Fallback for systems without a udev database (containers, initrd)."""
+    output = subprocess.check_output(
+        ["lsblk", "-J", "-o", "NAME,UUID,LABEL,FSTYPE,MOUNTPOINT,SIZE,MODEL,TRAN"],
+        text=True
+    )
+    return json.loads(output).get("blockdevices", [])
+
+def _signature():
+    """Changes whenever devices, their udev records or the mount table change."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        h.update("\0".join(sorted(os.listdir(SYS_CLASS_BLOCK))).encode())
+    except OSError:
+        pass
+    try:
+        # udev replaces records by rename, which bumps the directory mtime
+        h.update(str(os.stat(UDEV_DATA).st_mtime_ns).encode())
+    except OSError:
+        pass
+    try:
+        with open(MOUNTINFO, 'rb') as f:
+            h.update(f.read())
+    except OSError:
+        pass
+    return h.digest()
+
+def scan(use_cache=True):
+    """
+    lsblk -J compatible tree (name/uuid/label/fstype/mountpoint/size/model/tran,
+    partitions under "children"), read straight from sysfs, udev and mountinfo.
+    """
+    global _cache
+    sig = _signature()
+    with _cache_lock:
+        if use_cache and _cache and _cache[0] == sig:
+            return _cache[1]
+    if os.path.isdir(UDEV_DATA) and os.path.isdir(SYS_BLOCK):
+        devices = _scan_sysfs()
+    else:
+        devices = _scan_lsblk()
+    with _cache_lock:
+        _cache = (sig, devices)
+    return devices
+
+def invalidate():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+def flatten(devices):
+    """All nodes of a scan() tree, parents before children."""
+    out = []
+    def walk(node):
+        out.append(node)
+        for child in node.get("children", []):
+            walk(child)
+    for dev in devices:
+        walk(dev)
+    return out
@@ -0,0 +1,220 @@
+######
+# scripts/core/dbuslite.py
+######
+import socket
+import struct
+
+# Minimal D-Bus wire client: EXTERNAL auth, method calls, replies.
+# Enough for org.freedesktop.Notifications without pulling in a binding.
+
+# [ CONSTANTS ]
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+FIELD_PATH = 1
+FIELD_INTERFACE = 2
+FIELD_MEMBER = 3
+FIELD_ERROR_NAME = 4
+FIELD_REPLY_SERIAL = 5
+FIELD_DESTINATION = 6
+FIELD_SIGNATURE = 8
+ALIGN = {'y': 1, 'b': 4, 'n': 2, 'q': 2, 'i': 4, 'u': 4, 'x': 8, 't': 8, 'd': 8,
+         's': 4, 'o': 4, 'g': 1, 'a': 4, '(': 8, '{': 8, 'v': 1}
+FIXED = {'y': 'B', 'b': 'I', 'n': 'h', 'q': 'H', 'i': 'i', 'u': 'I', 'x': 'q', 't': 'Q', 'd': 'd'}
+
+class DBusError(Exception):
+    pass
+
+class Variant:
+    def __init__(self, signature, value):
+        self.signature = signature
+        self.value = value
+
+def split_signature(sig):
+    """Splits a signature into complete types: 'sa{sv}i' -> ['s', 'a{sv}', 'i']."""
+    out = []
+    i = 0
+    while i < len(sig):
+        j = _type_end(sig, i)
+        out.append(sig[i:j])
+        i = j
+    return out
+
+def _type_end(sig, i):
+    c = sig[i]
+    if c == 'a':
+        return _type_end(sig, i + 1)
+    if c in '({':
+        close = ')' if c == '(' else '}'
+        depth = 0
+        for j in range(i, len(sig)):
+            if sig[j] in '({': depth += 1
+            elif sig[j] in ')}': depth -= 1
+            if depth == 0:
+                return j + 1
+        raise DBusError(f"unbalanced signature {sig}")
+    return i + 1
+
+class Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pad(self, n):
+        self.buf.extend(b"\0" * (-len(self.buf) % n))
+
+    def write(self, sig, value):
+        c = sig[0]
+        self.pad(ALIGN[c])
+        if c in FIXED:
+            self.buf.extend(struct.pack('<' + FIXED[c], int(value) if c != 'd' else value))
+        elif c in 'so':
+            data = value.encode()
+            self.buf.extend(struct.pack('<I', len(data)) + data + b"\0")
+        elif c == 'g':
+            data = value.encode()
+            self.buf.extend(struct.pack('<B', len(data)) + data + b"\0")
+        elif c == 'v':
+            self.write('g', value.signature)
+            self.write(value.signature, value.value)
+        elif c == 'a':
+            inner = sig[1:]
+            self.buf.extend(b"\0\0\0\0")
+            len_pos = len(self.buf) - 4
+            self.pad(ALIGN[inner[0]])
+            start = len(self.buf)
+            items = value.items() if inner[0] == '{' else value
+            for item in items:
+                self.write(inner, item)
+            struct.pack_into('<I', self.buf, len_pos, len(self.buf) - start)
+        elif c in '({':
+            for part, item in zip(split_signature(sig[1:-1]), value):
+                self.write(part, item)
+        else:
+            raise DBusError(f"unsupported type {c}")
+
+class Reader:
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.pos = offset
+
+    def align(self, n):
+        self.pos += -self.pos % n
+
+    def read(self, sig):
+        c = sig[0]
+        self.align(ALIGN[c])
+        if c in FIXED:
+            fmt = '<' + FIXED[c]
+            value = struct.unpack_from(fmt, self.data, self.pos)[0]
+            self.pos += struct.calcsize(fmt)
+            return value
+        if c in 'so':
+            n = struct.unpack_from('<I', self.data, self.pos)[0]
+            value = self.data[self.pos + 4:self.pos + 4 + n].decode(errors='replace')
+            self.pos += 5 + n
+            return value
+        if c == 'g':
+            n = self.data[self.pos]
+            value = self.data[self.pos + 1:self.pos + 1 + n].decode()
+            self.pos += 2 + n
+            return value
+        if c == 'v':
+            inner = self.read('g')
+            return self.read(inner)
+        if c == 'a':
+            n = struct.unpack_from('<I', self.data, self.pos)[0]
+            self.pos += 4
+            inner = sig[1:]
+            self.align(ALIGN[inner[0]])
+            end = self.pos + n
+            items = []
+            while self.pos < end:
+                items.append(self.read(inner))
+            return dict(items) if inner[0] == '{' else items
+        if c in '({':
+            return tuple(self.read(part) for part in split_signature(sig[1:-1]))
+        raise DBusError(f"unsupported type {c}")
+
+class Connection:
+    """One authenticated connection to a bus socket."""
+    def __init__(self, path, uid, timeout=2.0):
+        self.serial = 0
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.rbuf = b""
+        self._auth(uid)
+        self.unique_name = self.call(
+            "org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus", "Hello"
+        )[0]
+
+    def _auth(self, uid):
+        self.sock.sendall(b"\0AUTH EXTERNAL " + str(uid).encode().hex().encode() + b"\r\n")
+        line = self._read_line()
+        if not line.startswith(b"OK "):
+            raise DBusError(f"auth rejected: {line!r}")
+        self.sock.sendall(b"BEGIN\r\n")
+
+    def _read_line(self):
+        while b"\r\n" not in self.rbuf:
+            chunk = self.sock.recv(4096)
+            if not chunk: raise DBusError("connection closed during auth")
+            self.rbuf += chunk
+        line, _, self.rbuf = self.rbuf.partition(b"\r\n")
+        return line
+
+    def _recv_exact(self, n):
+        while len(self.rbuf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk: raise DBusError("connection closed")
+            self.rbuf += chunk
+        data, self.rbuf = self.rbuf[:n], self.rbuf[n:]
+        return data
+
+    def _read_message(self):
+        head = self._recv_exact(16)
+        if head[0:1] != b'l':
+            raise DBusError("big-endian peers are not supported")
+        msg_type = head[1]
+        body_len, serial, fields_len = struct.unpack_from('<III', head, 4)
+        rest = self._recv_exact(fields_len + (-(16 + fields_len) % 8) + body_len)
+        data = head + rest
+        fields = dict(Reader(data, 12).read('a(yv)'))
+        body_start = 16 + fields_len + (-(16 + fields_len) % 8)
+        sig = fields.get(FIELD_SIGNATURE, "")
+        reader = Reader(data, body_start)
+        body = [reader.read(t) for t in split_signature(sig)]
+        return msg_type, fields, body
+
+    def call(self, destination, path, interface, member, signature="", args=()):
+        self.serial += 1
+        serial = self.serial
+        body = Writer()
+        for part, arg in zip(split_signature(signature), args):
+            body.write(part, arg)
+        fields = [
+            (FIELD_PATH, Variant('o', path)),
+            (FIELD_INTERFACE, Variant('s', interface)),
+            (FIELD_MEMBER, Variant('s', member)),
+            (FIELD_DESTINATION, Variant('s', destination)),
+        ]
+        if signature:
+            fields.append((FIELD_SIGNATURE, Variant('g', signature)))
+        msg = Writer()
+        msg.buf.extend(struct.pack('<cBBBII', b'l', METHOD_CALL, 0, 1, len(body.buf), serial))
+        msg.write('a(yv)', fields)
+        msg.pad(8)
+        self.sock.sendall(bytes(msg.buf) + bytes(body.buf))
+
+        while True:
+            msg_type, reply_fields, reply_body = self._read_message()
+            if reply_fields.get(FIELD_REPLY_SERIAL) != serial:
+                continue  # Signals (NameAcquired, ...) are not ours to handle
+            if msg_type == ERROR:
+                detail = reply_body[0] if reply_body else ""
+                raise DBusError(f"{reply_fields.get(FIELD_ERROR_NAME)}: {detail}")
+            return reply_body
+
+    def close(self):
+        try: self.sock.close()
+        except OSError: pass
@@ -0,0 +1,253 @@
+######
+# scripts/core/dedup.py
+######
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# [ CONSTANTS ]
+INDEX_NAME = "System/ZenFS/content.db"
+PARTIAL_BLOCK = 64 * 1024      # Bytes hashed from head and tail
+HASH_CHUNK = 1024 * 1024
+REFRESH_INTERVAL = 3600        # Seconds before a drive index is re-walked
+
+def partial_hash(path, size=None):
+    """Hash of size + first and last PARTIAL_BLOCK bytes. Cheap collision filter."""
+    if size is None:
+        size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, 'little'))
+    with open(path, 'rb') as f:
+        h.update(f.read(PARTIAL_BLOCK))
+        if size > 2 * PARTIAL_BLOCK:
+            f.seek(size - PARTIAL_BLOCK)
+            h.update(f.read(PARTIAL_BLOCK))
+    return h.hexdigest()
+
+def full_hash(path):
+    """Streaming hash of the whole file."""
+    h = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(HASH_CHUNK)
+            if not buf: break
+            h.update(buf)
+    return h.hexdigest()
+
+class ContentIndex:
+    """
+    Persistent content index of one roaming drive (System/ZenFS/content.db).
+    Rows are keyed by drive-relative path; hashes are filled lazily, only for
+    files whose size collides with an offload candidate, and are dropped when
+    size or mtime change.
+    """
+    def __init__(self, drive_root):
+        self.drive_root = drive_root
+        self.db_path = os.path.join(drive_root, INDEX_NAME)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER,"
+            " partial TEXT, full TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_size ON files(size)")
+        self.conn.commit()
+        self.refreshed_at = 0
+        self.refreshing = None  # Background refresh thread, if one is running
+
+    def refresh_async(self):
+        """Starts a refresh on its own thread if one is due, so callers (transfer workers) never walk the drive."""
+        if time.time() - self.refreshed_at < REFRESH_INTERVAL:
+            return
+        with self.lock:
+            if self.refreshing and self.refreshing.is_alive():
+                return
+            def run():
+                try:
+                    self.refresh()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[Dedup] Index refresh failed on {self.drive_root}: {e}")
+            self.refreshing = threading.Thread(target=run, name="dedup-refresh", daemon=True)
+            self.refreshing.start()
+
+    def refresh(self, force=False):
+        """Re-walks Users/ and syncs rows with what is actually on the drive."""
+        if not force and time.time() - self.refreshed_at < REFRESH_INTERVAL:
+            return
+        users_root = os.path.join(self.drive_root, "Users")
+        seen = {}
+        stack = [users_root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'): continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                rel = os.path.relpath(entry.path, self.drive_root)
+                                seen[rel] = (st.st_size, st.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+        with self.lock:
+            known = {row[0]: (row[1], row[2]) for row in self.conn.execute("SELECT path, size, mtime FROM files")}
+            gone = [(p,) for p in known if p not in seen]
+            changed = [(p, s, m) for p, (s, m) in seen.items() if known.get(p) != (s, m)]
+            self.conn.executemany("DELETE FROM files WHERE path = ?", gone)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, partial, full) VALUES (?, ?, ?, NULL, NULL)",
+                changed
+            )
+            self.conn.commit()
+        self.refreshed_at = time.time()
+
+    def has_size(self, size, prefix=""):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM files WHERE size = ? AND substr(path, 1, ?) = ? LIMIT 1", (size, len(prefix), prefix)
+            ).fetchone() is not None
+
+    def add(self, abs_path, partial=None, full=None):
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return
+        rel = os.path.relpath(abs_path, self.drive_root)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, partial, full) VALUES (?, ?, ?, ?, ?)",
+                (rel, st.st_size, st.st_mtime_ns, partial, full)
+            )
+            self.conn.commit()
+
+    def _hash_column(self, rel, column, func):
+        """Returns a cached hash for rel, recomputing it if the file changed."""
+        abs_path = os.path.join(self.drive_root, rel)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            with self.lock:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (rel,))
+                self.conn.commit()
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT size, mtime, {column} FROM files WHERE path = ?", (rel,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns and row[2]:
+            return row[2]
+        try:
+            value = func(abs_path)
+        except OSError:
+            return None
+        with self.lock:
+            if row and (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+                self.conn.execute(
+                    "UPDATE files SET size = ?, mtime = ?, partial = NULL, full = NULL WHERE path = ?",
+                    (st.st_size, st.st_mtime_ns, rel)
+                )
+            self.conn.execute(f"UPDATE files SET {column} = ? WHERE path = ?", (value, rel))
+            self.conn.commit()
+        return value
+
+    def find(self, size, src_partial, src_full_func, prefix=""):
+        """
+        Returns the absolute path of a drive file identical to the source, or None.
+        Only drive paths starting with prefix are considered. Stages: size
+        bucket -> partial hash -> full hash. src_full_func is only called if
+        some candidate survives the partial stage.
+        """
+        with self.lock:
+            candidates = [r[0] for r in self.conn.execute(
+                "SELECT path FROM files WHERE size = ? AND substr(path, 1, ?) = ?", (size, len(prefix), prefix)
+            )]
+        survivors = [rel for rel in candidates if self._hash_column(rel, "partial", partial_hash) == src_partial]
+        if not survivors:
+            return None
+        src_full = src_full_func()
+        for rel in survivors:
+            if self._hash_column(rel, "full", full_hash) == src_full:
+                return os.path.join(self.drive_root, rel)
+        return None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class Deduplicator:
+    """Looks up offload candidates against the content indexes of all drives."""
+    def __init__(self, min_size=1024 * 1024):
+        self.min_size = min_size
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index_for(self, drive_root):
+        with self.lock:
+            idx = self.indexes.get(drive_root)
+            if idx is None:
+                try:
+                    idx = ContentIndex(drive_root)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[Dedup] Cannot open index on {drive_root}: {e}")
+                    return None
+                self.indexes[drive_root] = idx
+        # Never walk the drive here: this runs on a transfer worker
+        idx.refresh_async()
+        return idx
+
+    def forget_missing(self):
+        """Closes indexes of drives that are no longer mounted."""
+        with self.lock:
+            for root in [r for r in self.indexes if not os.path.isdir(r)]:
+                self.indexes.pop(root).close()
+
+    def find_duplicate(self, filepath, size, drive_roots, prefix):
+        """
+        Drive file identical to filepath, or None. Matches are limited to drive
+        paths under prefix (the owner's Users/<user>/ tree) and to files owned
+        by the same uid, so a shadow never points into data the owner cannot
+        read or that someone else can change.
+        """
+        if size < self.min_size:
+            return None
+        indexes = [i for i in (self.index_for(r) for r in drive_roots) if i and i.has_size(size, prefix)]
+        if not indexes:
+            return None
+        try:
+            src_partial = partial_hash(filepath, size)
+            src_uid = os.stat(filepath).st_uid
+        except OSError:
+            return None
+        src_full = []
+        def lazy_full():
+            if not src_full:
+                src_full.append(full_hash(filepath))
+            return src_full[0]
+        for idx in indexes:
+            try:
+                match = idx.find(size, src_partial, lazy_full, prefix)
+                if match and os.stat(match).st_uid != src_uid:
+                    match = None
+            except (OSError, sqlite3.Error) as e:
+                print(f"[Dedup] Lookup failed on {idx.drive_root}: {e}")
+                continue
+            if match:
+                return match
+        return None
+
+    def record(self, drive_root, abs_path):
+        idx = self.index_for(drive_root)
+        if idx:
+            try: idx.add(abs_path)
+            except sqlite3.Error: pass
@@ -0,0 +1,166 @@
+######
+# scripts/core/devmon.py
+######
+import os
+import time
+import select
+import socket
+import struct
+
+# [ CONSTANTS ]
+NETLINK_KOBJECT_UEVENT = 15
+GROUP_KERNEL = 1  # Raw kernel uevents, arrive before udev has probed the device
+GROUP_UDEV = 2    # udev re-broadcast, carries ID_FS_UUID & co.
+UDEV_PREFIX = b"libudev\0"
+DEBOUNCE = 0.3    # Seconds of silence that end an event burst
+MAX_BURST = 2.0   # Upper bound for collecting one burst
+
+def parse_uevent(data):
+    """Turns a kernel or udev netlink datagram into a property dict."""
+    props = {}
+    if data.startswith(UDEV_PREFIX):
+        try:
+            off, length = struct.unpack_from("=II", data, 16)
+            data = data[off:off + length]
+        except struct.error:
+            return props
+        fields = data.split(b"\0")
+    else:
+        fields = data.split(b"\0")
+        # First field is "action@devpath"
+        if fields and b"@" in fields[0] and b"=" not in fields[0]:
+            fields = fields[1:]
+    for field in fields:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            props[key.decode(errors="replace")] = value.decode(errors="replace")
+    return props
+
+class UeventSource:
+    """Kernel/udev uevent netlink socket, filtered to block devices."""
+    events = select.POLLIN
+
+    def __init__(self, groups=GROUP_KERNEL | GROUP_UDEV):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK, NETLINK_KOBJECT_UEVENT)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        except OSError:
+            pass
+        self.sock.bind((0, groups))
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self):
+        out = []
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                # ENOBUFS: we lost events, force a rescan
+                out.append({"ACTION": "overflow", "SUBSYSTEM": "block", "ERROR": str(e)})
+                break
+            props = parse_uevent(data)
+            if props.get("SUBSYSTEM") == "block":
+                out.append(props)
+        return out
+
+    def close(self):
+        self.sock.close()
+
+class MountTableSource:
+    """/proc/self/mountinfo signals POLLPRI whenever the mount table changes."""
+    events = select.POLLPRI | select.POLLERR
+
+    def __init__(self, path="/proc/self/mountinfo"):
+        self.f = open(path, 'rb')
+        self.f.read()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def read(self):
+        # Re-reading acknowledges the change
+        self.f.seek(0)
+        self.f.read()
+        return [{"ACTION": "change", "SUBSYSTEM": "mounts"}]
+
+    def close(self):
+        self.f.close()
+
+class FakeSource:
+    """Pollable in-process source for tests: push() events, the monitor picks them up."""
+    events = select.POLLIN
+
+    def __init__(self):
+        self.r, self.w = os.pipe()
+        os.set_blocking(self.r, False)
+        self.pending = []
+
+    def push(self, action="add", devname="sdz1", subsystem="block", **extra):
+        props = {"ACTION": action, "DEVNAME": devname, "SUBSYSTEM": subsystem}
+        props.update(extra)
+        self.pending.append(props)
+        os.write(self.w, b"\0")
+
+    def fileno(self):
+        return self.r
+
+    def read(self):
+        try:
+            while os.read(self.r, 4096): pass
+        except BlockingIOError:
+            pass
+        out, self.pending = self.pending, []
+        return out
+
+    def close(self):
+        os.close(self.r)
+        os.close(self.w)
+
+class DeviceMonitor:
+    """Blocks until block-device or mount-table activity, then returns the debounced burst."""
+    def __init__(self, sources):
+        self.sources = {s.fileno(): s for s in sources}
+        self.poller = select.poll()
+        for fd, source in self.sources.items():
+            self.poller.register(fd, source.events)
+
+    @classmethod
+    def system(cls):
+        """Netlink + mountinfo monitor, or None if netlink is unavailable."""
+        sources = []
+        try:
+            sources.append(UeventSource())
+        except (OSError, AttributeError) as e:
+            print(f"[Nomad] uevent socket unavailable: {e}")
+            return None
+        try:
+            sources.append(MountTableSource())
+        except OSError as e:
+            print(f"[Nomad] mountinfo watch unavailable: {e}")
+        return cls(sources)
+
+    def _drain(self, timeout):
+        events = []
+        for fd, mask in self.poller.poll(None if timeout is None else int(timeout * 1000)):
+            events.extend(self.sources[fd].read())
+        return events
+
+    def wait(self, timeout=None):
+        """Returns a list of events, or [] on timeout."""
+        events = self._drain(timeout)
+        if not events:
+            return []
+        deadline = time.monotonic() + MAX_BURST
+        while time.monotonic() < deadline:
+            more = self._drain(DEBOUNCE)
+            if not more: break
+            events.extend(more)
+        return events
+
+    def close(self):
+        for source in self.sources.values():
+            source.close()
@@ -0,0 +1,97 @@
+######
+# scripts/core/idcache.py
+######
+import os
+import json
+import fcntl
+import time
+import threading
+
+# [ CONSTANTS ]
+CACHE_FILE = "/System/ZenFS/Database/foreign_drives.json"
+FOREIGN_TTL = 7 * 86400  # Re-probe a known foreign drive after this long, even unchanged
+
+class ForeignDriveCache:
+    """
+    Persistent record of filesystems that were probed and are not ZenFS roaming drives.
+    Keyed by filesystem UUID. An entry only applies while the device generation
+    (fstype, size, label) is unchanged; within one attachment (same kernel diskseq)
+    it never expires, across re-plugs it expires after FOREIGN_TTL.
+    """
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.entries = self._load()
+
+    def _stat_mtime(self):
+        """(inode, mtime) of the file; os.replace gives every rewrite a new inode."""
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        self.mtime = self._stat_mtime()
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _refresh(self):
+        """Re-reads the file if another process (mint, another instance) rewrote it."""
+        if self._stat_mtime() != self.mtime:
+            self.entries = self._load()
+
+    def _save(self, uuid, entry):
+        """
+        Applies one change (entry None = forget) on top of what is on disk and
+        writes it back, so changes made by other processes are not overwritten.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.lock", 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.entries = self._load()
+                if entry is None:
+                    self.entries.pop(uuid, None)
+                else:
+                    self.entries[uuid] = entry
+                tmp = f"{self.path}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(self.entries, f, indent=2)
+                os.replace(tmp, self.path)
+                self.mtime = self._stat_mtime()
+        except OSError as e:
+            print(f"[IdCache] Failed to save {self.path}: {e}")
+
+    def lookup(self, uuid, generation, diskseq=None):
+        """Returns the cached rejection reason, or None if the drive must be probed."""
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(uuid)
+        if not entry or entry.get("generation") != generation:
+            return None
+        if diskseq is not None and entry.get("diskseq") == diskseq:
+            return entry.get("reason")
+        if time.time() - entry.get("rejected_at", 0) < FOREIGN_TTL:
+            return entry.get("reason")
+        return None
+
+    def reject(self, uuid, generation, reason, diskseq=None):
+        with self.lock:
+            self._save(uuid, {
+                "generation": generation,
+                "diskseq": diskseq,
+                "reason": reason,
+                "rejected_at": time.time()
+            })
+
+    def forget(self, uuid):
+        with self.lock:
+            self._refresh()
+            if uuid in self.entries:
+                self._save(uuid, None)
@@ -14,6 +14,10 @@ from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+import prewarm
+import indexseed
+from indexseed import MUSIC_PSEUDO_DIRS
+
 # [ CONSTANTS ]
 SYSTEM_DB = "/System/ZenFS/Database"
 ROOT_ID_FILE = "/System/ZenFS/drive.json"
@@ -31,11 +35,6 @@ EXCLUDED_ROOTS = {
     'System', 'Live', 'Mount', 'Users', 'Apps', 'Config', 'Drives'
 }
 
-MUSIC_PSEUDO_DIRS = {
-    'Artists', 'Albums', 'Years', 'Genres', 'OSTs', '.building', '.trash_Artists', 
-    '.trash_Albums', '.trash_Years', '.trash_Genres', '.trash_OSTs'
-}
-
 print_lock = threading.Lock()
 def safe_print(msg):
     with print_lock:
@@ -225,22 +224,22 @@ class ZenFSHandler(FileSystemEventHandler):
             except Exception as e:
                 safe_print(f"[Err] Dir Projection: {e}")
 
-    def _sync_dir(self, src_path):
+    def _sync_dir(self, src_path, local=True):
         if self._is_ignored_path(src_path): return
         rel_path = self._get_rel_path(src_path)
-        if self.is_roaming:
+        if self.is_roaming and local:
             self._ensure_dir_structure(self.local_db_root, rel_path)
         self._ensure_dir_structure(SYSTEM_DB, rel_path)
         if self.is_roaming:
             self._project_dir_hologram(rel_path)
 
-    def _sync_file(self, src_path):
+    def _sync_file(self, src_path, local=True):
         if os.path.isdir(src_path): return
         if os.path.islink(src_path): return 
         if self._is_ignored_path(src_path): return 
         rel_path = os.path.dirname(self._get_rel_path(src_path))
         filename = os.path.basename(src_path)
-        if self.is_roaming:
+        if self.is_roaming and local:
             self._write_db_entry(self.local_db_root, rel_path, filename)
         self._write_db_entry(SYSTEM_DB, rel_path, filename)
         if self.is_roaming:
@@ -306,21 +305,41 @@ def initial_scan(root, uuid_str, executor, is_roaming=False):
     safe_print(f"[Scan] Starting background scan for {root} ({uuid_str})")
     handler = ZenFSHandler(root, uuid_str, executor, is_roaming)
     count = 0
-    for dirpath, dirnames, filenames in os.walk(root):
+    # Nomad may have read the drive's metadata right after mounting it
+    listing = prewarm.take_listing(root, uuid_str) if is_roaming else None
+    walker = prewarm.walk_listing(root, listing) if listing else os.walk(root)
+    if listing:
+        safe_print(f"[Scan] Using prewarmed listing for {root}")
+    # A drive seeded at mint time (or fully scanned on a previous attach) keeps a
+    # valid local index for every directory whose mtime has not changed since
+    seeded = indexseed.load_marker(root, uuid_str) if is_roaming else None
+    if seeded is not None:
+        safe_print(f"[Scan] {root} has a scan marker, checking for changes only")
+    seen = {}
+    for dirpath, dirnames, filenames in walker:
         if root == '/': dirnames[:] = [d for d in dirnames if d not in EXCLUDED_ROOTS]
         dirnames[:] = [d for d in dirnames if not d.startswith('.') and not d.startswith('nixbld')]
         if "System/ZenFS" in dirpath: continue
         if 'Music' in Path(dirpath).parts:
             dirnames[:] = [d for d in dirnames if d not in MUSIC_PSEUDO_DIRS]
+        rel = os.path.relpath(dirpath, root)
+        try:
+            seen[rel] = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            seen[rel] = None
+        fresh = seeded is not None and seen[rel] is not None and seeded.get(rel) == seen[rel]
         for d in dirnames:
             if d.startswith('.') or d.startswith('nixbld'): continue
             full_path = os.path.join(dirpath, d)
-            handler._sync_dir(full_path)
+            handler._sync_dir(full_path, local=not fresh or os.path.normpath(os.path.join(rel, d)) not in seeded)
         for f in filenames:
             if f.startswith('.'): continue
             full_path = os.path.join(dirpath, f)
-            handler._sync_file(full_path)
+            handler._sync_file(full_path, local=not fresh)
             count += 1
+    # Only a walk of the whole drive (not a moved subtree) can vouch for it
+    if is_roaming and get_drive_uuid(root) == uuid_str:
+        indexseed.write_marker(root, uuid_str, {k: v for k, v in seen.items() if v is not None})
     safe_print(f"[Scan] Finished {root}. Processed {count} items.")
 
 def main():
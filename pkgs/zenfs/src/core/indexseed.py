@@ -0,0 +1,119 @@
+######
+# scripts/core/indexseed.py
+######
+import os
+import json
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Bulk-builds a roaming drive's local index (System/ZenFS/Database) in the same
+# layout the Librarian writes, and records which directories it covers so the
+# first attach only re-indexes what changed since.
+
+# [ CONSTANTS ]
+DB_REL = "System/ZenFS/Database"
+SCAN_MARKER_REL = "System/ZenFS/scan.json"
+SEED_WORKERS = 8
+
+MUSIC_PSEUDO_DIRS = {
+    'Artists', 'Albums', 'Years', 'Genres', 'OSTs', '.building', '.trash_Artists', 
+    '.trash_Albums', '.trash_Years', '.trash_Genres', '.trash_OSTs'
+}
+
+def _skip_dir(name, parent_parts):
+    if name.startswith('.') or name.startswith('nixbld'): return True
+    return 'Music' in parent_parts and name in MUSIC_PSEUDO_DIRS
+
+def _ensure_db_dir(db_dir, drive_uuid):
+    os.makedirs(db_dir, exist_ok=True)
+    os.chmod(db_dir, 0o755)
+    meta_file = os.path.join(db_dir, ".zenfs-folder-info")
+    if not os.path.exists(meta_file):
+        with open(meta_file, 'w') as f:
+            f.write(drive_uuid)
+        os.chmod(meta_file, 0o644)
+
+def _seed_dir(drive_root, rel, drive_uuid):
+    """
+    Indexes one directory: its subdirectories get DB folders, its files get
+    entries. Returns (mtime_ns, subdirs_to_descend, files_written).
+    """
+    path = drive_root if rel == "." else os.path.join(drive_root, rel)
+    st = os.stat(path)
+    with os.scandir(path) as it:
+        entries = list(it)
+
+    parts = Path(path).parts
+    db_dir = os.path.join(drive_root, DB_REL, "" if rel == "." else rel)
+    descend = []
+    written = 0
+    for entry in entries:
+        child_rel = entry.name if rel == "." else os.path.join(rel, entry.name)
+        try:
+            if entry.is_dir():
+                if _skip_dir(entry.name, parts): continue
+                if child_rel == "System" or child_rel.startswith("System/ZenFS"): continue
+                _ensure_db_dir(os.path.join(drive_root, DB_REL, child_rel), drive_uuid)
+                if not entry.is_symlink():
+                    descend.append(child_rel)
+            elif not entry.name.startswith('.') and not entry.is_symlink():
+                _ensure_db_dir(db_dir, drive_uuid)
+                target = os.path.join(db_dir, entry.name)
+                with open(target, 'w') as f:
+                    f.write(drive_uuid)
+                os.chmod(target, 0o644)
+                written += 1
+        except OSError as e:
+            print(f"[Seed] {child_rel}: {e}")
+    return st.st_mtime_ns, descend, written
+
+def seed(drive_root, drive_uuid, workers=SEED_WORKERS):
+    """
+    Walks drive_root breadth-first, indexing directories in parallel, then
+    writes the scan marker. Returns the number of files indexed.
+    """
+    start = time.monotonic()
+    dirs = {}
+    total = 0
+    level = ["."]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while level:
+            futures = [(rel, pool.submit(_seed_dir, drive_root, rel, drive_uuid)) for rel in level]
+            level = []
+            for rel, future in futures:
+                try:
+                    mtime_ns, descend, written = future.result()
+                except OSError as e:
+                    print(f"[Seed] Skipping {rel}: {e}")
+                    continue
+                dirs[rel] = mtime_ns
+                total += written
+                level.extend(descend)
+    write_marker(drive_root, drive_uuid, dirs)
+    print(f"[Seed] Indexed {total} files in {len(dirs)} directories ({time.monotonic() - start:.1f}s)")
+    return total
+
+def write_marker(drive_root, drive_uuid, dirs):
+    """dirs: {rel ('.' for the root): directory mtime_ns at the time it was indexed}"""
+    path = os.path.join(drive_root, SCAN_MARKER_REL)
+    tmp = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump({"uuid": drive_uuid, "completed_at": time.time(), "dirs": dirs}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[Seed] Failed to write scan marker for {drive_root}: {e}")
+
+def load_marker(drive_root, drive_uuid):
+    """Returns the {rel: mtime_ns} map of a complete scan of this drive, or None."""
+    try:
+        with open(os.path.join(drive_root, SCAN_MARKER_REL), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A re-minted drive keeps its files but gets a new identity
+    if data.get("uuid") != drive_uuid:
+        return None
+    return data.get("dirs")
@@ -8,6 +8,8 @@ import pwd
 import json
 import uuid
 import time
+import stat
+from concurrent.futures import ThreadPoolExecutor
 
 # [ CONSTANTS ]
 SYSTEM_DB = "/System/ZenFS/Database"
@@ -17,12 +19,92 @@ XDG_TEMPLATE = [
     "Projects", "3D", "Android", "AI", "Apps & Scripts", 
     "Doom", "Rift", "Misc", "Passwords", "Downloads/Waiting"
 ]
+PROVISION_WORKERS = 8
 
-def ensure_dir(path, uid, gid, mode=0o755):
-    if not os.path.exists(path):
-        os.makedirs(path)
-    os.chmod(path, mode)
-    os.chown(path, uid, gid)
+DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+def provision_home(home_dir, uid, gid, mode=0o755, template=XDG_TEMPLATE):
+    """
+    Brings the XDG template under home_dir to the wanted owner and mode.
+    Runs as root on directories the user controls, so everything goes through
+    O_NOFOLLOW directory fds (fstat/fchmod/fchown, mkdir relative to the
+    parent fd): a folder the user replaced with a symlink is skipped, never
+    followed. chmod/chown are only issued for entries that differ. Missing
+    intermediate directories are created for the user, existing ones are
+    left as the user set them. Returns the number of changes made.
+    """
+    changes = 0
+    wanted = set(template)
+    targets = set()
+    for folder in template:
+        parts = folder.split("/")
+        targets.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    try:
+        fds = {"": os.open(home_dir, DIR_FLAGS)}
+    except FileNotFoundError:
+        return 0
+    try:
+        # Sorted so parents are handled (and opened) before their children
+        for rel in sorted(targets):
+            parent_rel, _, name = rel.rpartition("/")
+            parent_fd = fds.get(parent_rel)
+            if parent_fd is None:
+                continue  # Parent was skipped
+            path = os.path.join(home_dir, rel)
+            try:
+                fd = os.open(name, DIR_FLAGS, dir_fd=parent_fd)
+            except FileNotFoundError:
+                os.mkdir(name, mode, dir_fd=parent_fd)
+                fd = os.open(name, DIR_FLAGS, dir_fd=parent_fd)
+                os.fchmod(fd, mode)  # mkdir is subject to the umask
+                os.fchown(fd, uid, gid)
+                fds[rel] = fd
+                changes += 1
+                continue
+            except OSError:
+                # ELOOP (a symlink) or ENOTDIR
+                print(f"[Gatekeeper] {path} is not a plain directory, skipping.")
+                continue
+            fds[rel] = fd
+            if rel not in wanted:
+                continue
+            st = os.fstat(fd)
+            if stat.S_IMODE(st.st_mode) != mode:
+                os.fchmod(fd, mode)
+                changes += 1
+            if st.st_uid != uid or st.st_gid != gid:
+                os.fchown(fd, uid, gid)
+                changes += 1
+    finally:
+        for fd in fds.values():
+            os.close(fd)
+    return changes
+
+def provision_homes(root="/home", workers=PROVISION_WORKERS):
+    """Provisions every home under root whose name is a known user, in parallel."""
+    users = {p.pw_name: p for p in pwd.getpwall()}
+    homes = []
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                user = users.get(entry.name)
+                if user and entry.is_dir(follow_symlinks=False):
+                    homes.append((entry.path, user.pw_uid, user.pw_gid))
+    except FileNotFoundError:
+        return 0
+
+    def run(job):
+        try:
+            return provision_home(*job)
+        except OSError as e:
+            print(f"[Gatekeeper] Failed to provision {job[0]}: {e}")
+            return 0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(homes) or 1))) as pool:
+        changes = sum(pool.map(run, homes))
+    print(f"[Gatekeeper] Provisioned {len(homes)} homes ({changes} changes).")
+    return changes
 
 def init_system_root():
     if not os.path.exists(SYSTEM_DB):
@@ -53,15 +135,7 @@ def main():
     init_system_root()
     
     # Ensure basic XDG dirs exist in /home for all users
-    if os.path.exists("/home"):
-        for username in os.listdir("/home"):
-            home_dir = os.path.join("/home", username)
-            if os.path.isdir(home_dir):
-                try:
-                    user_info = pwd.getpwnam(username)
-                    for folder in XDG_TEMPLATE:
-                        ensure_dir(os.path.join(home_dir, folder), user_info.pw_uid, user_info.pw_gid)
-                except: pass
+    provision_homes()
 
     print("[Gatekeeper] Gates are open.")
 
@@ -2,47 +2,79 @@
 # scripts/core/notify.py
 ######
 import os
+import json
+import socket
 import subprocess
 import pwd
 import shutil
 
-def send(title, message, urgency="normal", icon="drive-harddisk"):
+# [ CONSTANTS ]
+BROKER_SOCKET = "/run/zenfs/notify.sock"  # Served by notifyd.py
+
+_broker = None
+
+def _send_broker(payload):
+    """Hands the notification to the broker. Returns False if it is not running."""
+    global _broker
+    try:
+        if _broker is None:
+            _broker = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        _broker.sendto(json.dumps(payload).encode(), BROKER_SOCKET)
+        return True
+    except OSError:
+        return False
+
+def _send_legacy(title, message, urgency, icon):
+    """Fallback without broker: one runuser + notify-send per message."""
+    # 1. Identify the primary user (Assumes UID 1000 for ZenOS single-user focus)
+    target_uid = 1000
+    try:
+        user_record = pwd.getpwuid(target_uid)
+        username = user_record.pw_name
+    except KeyError:
+        print(f"[Notify] UID {target_uid} not found. Skipping notification.")
+        return
+
+    # 2. Construct the DBus Address
+    # NixOS typically places the user bus at /run/user/<uid>/bus
+    dbus_address = f"unix:path=/run/user/{target_uid}/bus"
+
+    if not os.path.exists(f"/run/user/{target_uid}/bus"):
+        # User might not be logged in
+        return
+
+    # 3. Construct the command using runuser
+    # Arguments are passed as argv (no shell), so message text cannot break quoting.
+    # Note: util-linux (providing runuser) must be in the service PATH.
+    cmd = [
+        "runuser",
+        "-u", username,
+        "--",
+        "env", f"DBUS_SESSION_BUS_ADDRESS={dbus_address}",
+        "notify-send", "-u", urgency, "-i", icon, "-a", "ZenOS", title, message
+    ]
+
+    # 4. Execute
+    subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def send(title, message, urgency="normal", icon="drive-harddisk", category=None, source=None, summary=None):
     """
     Sends a notification to the primary user session.
-    Handles the context switch from Root (Systemd) to User (DBus).
+    Goes through the notification broker when it is running; otherwise handles
+    the context switch from Root (Systemd) to User (DBus) itself.
+
+    category: messages sharing it within a short window become one bubble
+              (defaults to the title); summary is its headline, e.g. "{count} drives mounted".
+    source:   rate limit bucket, usually the daemon name.
     """
     try:
-        # 1. Identify the primary user (Assumes UID 1000 for ZenOS single-user focus)
-        target_uid = 1000
-        try:
-            user_record = pwd.getpwuid(target_uid)
-            username = user_record.pw_name
-        except KeyError:
-            print(f"[Notify] UID {target_uid} not found. Skipping notification.")
+        payload = {"title": title, "message": message, "urgency": urgency, "icon": icon}
+        if category: payload["category"] = category
+        if source: payload["source"] = source
+        if summary: payload["summary"] = summary
+        if _send_broker(payload):
             return
-
-        # 2. Construct the DBus Address
-        # NixOS typically places the user bus at /run/user/<uid>/bus
-        dbus_address = f"unix:path=/run/user/{target_uid}/bus"
-        
-        if not os.path.exists(f"/run/user/{target_uid}/bus"):
-            # User might not be logged in
-            return
-
-        # 3. Construct the command using runuser
-        # We use 'bash -c' to ensure the environment variable is set correctly for the command.
-        # Note: util-linux (providing runuser) must be in the service PATH.
-        
-        cmd = [
-            "runuser", 
-            "-u", username, 
-            "--", 
-            "bash", "-c",
-            f"DBUS_SESSION_BUS_ADDRESS={dbus_address} notify-send -u {urgency} -i {icon} -a 'ZenOS' '{title}' '{message}'"
-        ]
-
-        # 4. Execute
-        subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _send_legacy(title, message, urgency, icon)
 
     except Exception as e:
-        print(f"[Notify] Error sending notification: {e}")
\ No newline at end of file
+        print(f"[Notify] Error sending notification: {e}")
@@ -0,0 +1,250 @@
+######
+# scripts/core/notifyd.py
+######
+import os
+import sys
+import json
+import pwd
+import time
+import socket
+import threading
+
+import dbuslite
+
+# [ CONSTANTS ]
+BROKER_SOCKET = "/run/zenfs/notify.sock"
+PRIMARY_UID = 1000  # ZenOS single-user focus, same default as notify.send
+URGENCY = {"low": 0, "normal": 1, "critical": 2}
+MAX_DATAGRAM = 65536
+COALESCE_WINDOW = 2.0   # Seconds a category collects messages before it is shown
+UPDATE_WINDOW = 120.0   # Reuse (replace) a category's bubble if it was shown this recently
+RATE_PER_MINUTE = 6     # Per source; excess is folded into the next bubble, not dropped
+RATE_BURST = 3
+MAX_LINES = 5           # Detail lines in a merged bubble
+
+class SessionNotifier:
+    """Keeps one authenticated session-bus connection per user and reuses it."""
+    def __init__(self):
+        self.connections = {}
+        self.cred_lock = threading.Lock()
+
+    def _connect(self, uid):
+        bus = f"/run/user/{uid}/bus"
+        if not os.path.exists(bus):
+            return None
+        # The session bus only admits its owner; borrow the user's identity for connect()
+        with self.cred_lock:
+            switch = os.geteuid() == 0 and uid != 0
+            if switch:
+                gid = pwd.getpwuid(uid).pw_gid
+                os.setegid(gid)
+                os.seteuid(uid)
+            try:
+                return dbuslite.Connection(bus, uid)
+            finally:
+                if switch:
+                    os.seteuid(0)
+                    os.setegid(0)
+
+    def notify(self, uid, title, message, urgency="normal", icon="drive-harddisk", replaces_id=0, timeout=-1):
+        """Returns the notification id, or None if the user has no session."""
+        for attempt in (1, 2):
+            conn = self.connections.get(uid)
+            if conn is None:
+                conn = self._connect(uid)
+                if conn is None:
+                    return None
+                self.connections[uid] = conn
+            try:
+                reply = conn.call(
+                    "org.freedesktop.Notifications", "/org/freedesktop/Notifications",
+                    "org.freedesktop.Notifications", "Notify", "susssasa{sv}i",
+                    ("ZenOS", replaces_id, icon, title, message, [],
+                     {"urgency": dbuslite.Variant('y', URGENCY.get(urgency, 1))}, timeout)
+                )
+                return reply[0] if reply else None
+            except (OSError, dbuslite.DBusError) as e:
+                # Session restarted or logged out: drop the connection, retry once
+                conn.close()
+                self.connections.pop(uid, None)
+                if attempt == 2:
+                    print(f"[Notifyd] Delivery to UID {uid} failed: {e}")
+        return None
+
+def logged_in_uids():
+    try:
+        return sorted(int(d) for d in os.listdir("/run/user") if d.isdigit() and int(d) >= 1000)
+    except OSError:
+        return []
+
+TEXT_FIELDS = ("title", "message", "category", "source", "icon", "summary", "urgency")
+
+def validate(request):
+    """Why a decoded datagram cannot be handled, or None if it is a well-formed request."""
+    if not isinstance(request, dict):
+        return "not an object"
+    uid = request.get("uid", PRIMARY_UID)
+    if uid != "all" and (not isinstance(uid, int) or isinstance(uid, bool)):
+        return f"bad uid {uid!r}"
+    for field in TEXT_FIELDS:
+        value = request.get(field)
+        if value is not None and not isinstance(value, str):
+            return f"{field} is not a string"
+    return None
+
+def targets(request):
+    uid = request.get("uid", PRIMARY_UID)
+    if uid == "all":
+        return logged_in_uids()
+    return [int(uid)]
+
+class RateLimiter:
+    """Token bucket per source."""
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.buckets = {}
+
+    def next_allowed(self, source, now):
+        tokens, stamp = self.buckets.get(source, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        self.buckets[source] = (tokens, now)
+        return now if tokens >= 1 else now + (1 - tokens) / self.rate
+
+    def take(self, source, now):
+        tokens, stamp = self.buckets.get(source, (self.burst, now))
+        self.buckets[source] = (tokens - 1, stamp)
+
+class Batch:
+    def __init__(self, request, now):
+        self.category = request.get("category") or request.get("title", "")
+        self.source = request.get("source") or "default"
+        self.title = request.get("title", "")
+        self.icon = request.get("icon", "drive-harddisk")
+        self.summary = request.get("summary")
+        self.urgency = request.get("urgency", "normal")
+        self.uids = set()
+        self.messages = []
+        self.deadline = now + COALESCE_WINDOW
+
+    def add(self, request, uids):
+        self.messages.append(request.get("message", ""))
+        self.uids.update(uids)
+        # A critical message escalates the whole bubble
+        if URGENCY.get(request.get("urgency"), 1) > URGENCY.get(self.urgency, 1):
+            self.urgency = request["urgency"]
+
+    def render(self):
+        count = len(self.messages)
+        if count == 1:
+            return self.messages[0]
+        lines = list(dict.fromkeys(self.messages))
+        detail = lines[:MAX_LINES]
+        if len(lines) > MAX_LINES:
+            detail.append(f"+{len(lines) - MAX_LINES} more")
+        head = self.summary.format(count=count) if self.summary else f"{count} updates"
+        return "\n".join([head] + detail)
+
+class Coalescer:
+    """
+    Merges messages of the same category over a short window, enforces
+    per-source rate limits and replaces a category's recent bubble in place.
+    """
+    def __init__(self, notifier):
+        self.notifier = notifier
+        self.pending = {}   # category -> Batch
+        self.shown = {}     # (uid, category) -> (notification id, shown at)
+        self.limiter = RateLimiter(RATE_PER_MINUTE, RATE_BURST)
+        self.cond = threading.Condition()
+
+    def add(self, request):
+        now = time.monotonic()
+        with self.cond:
+            category = request.get("category") or request.get("title", "")
+            uids = targets(request)  # Before touching pending, so a failure leaves no empty batch
+            batch = self.pending.get(category)
+            if batch is None:
+                batch = self.pending[category] = Batch(request, now)
+            batch.add(request, uids)
+            self.cond.notify()
+
+    def _due(self, now):
+        ready = []
+        next_wake = None
+        for category, batch in list(self.pending.items()):
+            due = max(batch.deadline, self.limiter.next_allowed(batch.source, now))
+            if due <= now:
+                self.limiter.take(batch.source, now)
+                ready.append(self.pending.pop(category))
+            elif next_wake is None or due < next_wake:
+                next_wake = due
+        return ready, next_wake
+
+    def deliver(self, batch):
+        message = batch.render()
+        now = time.monotonic()
+        for uid in sorted(batch.uids):
+            previous = self.shown.get((uid, batch.category))
+            replaces = previous[0] if previous and now - previous[1] < UPDATE_WINDOW else 0
+            nid = self.notifier.notify(uid, batch.title, message, batch.urgency, batch.icon, replaces)
+            if nid:
+                self.shown[(uid, batch.category)] = (nid, now)
+
+    def run(self):
+        while True:
+            with self.cond:
+                ready, next_wake = self._due(time.monotonic())
+                while not ready:
+                    self.cond.wait(None if next_wake is None else max(0.01, next_wake - time.monotonic()))
+                    ready, next_wake = self._due(time.monotonic())
+            for batch in ready:
+                try:
+                    self.deliver(batch)
+                except Exception as e:
+                    print(f"[Notifyd] Delivery failed: {e}")
+
+def serve(coalescer, sock):
+    while True:
+        data = sock.recv(MAX_DATAGRAM)
+        try:
+            request = json.loads(data)
+        except ValueError:
+            continue
+        problem = validate(request)
+        if problem:
+            print(f"[Notifyd] Dropping request: {problem}")
+            continue
+        try:
+            coalescer.add(request)
+        except Exception as e:
+            print(f"[Notifyd] Failed to queue request: {e}")
+
+def open_socket(path=BROKER_SOCKET):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    os.chmod(path, 0o660)
+    return sock
+
+def main():
+    sys.stdout.reconfigure(line_buffering=True)
+    print("::: ZenFS Notification Broker :::")
+    sock = open_socket()
+    print(f"[Notifyd] Listening on {BROKER_SOCKET}")
+    coalescer = Coalescer(SessionNotifier())
+    threading.Thread(target=coalescer.run, name="notifyd-flush", daemon=True).start()
+    try:
+        serve(coalescer, sock)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try: os.unlink(BROKER_SOCKET)
+        except OSError: pass
+
+if __name__ == "__main__":
+    main()
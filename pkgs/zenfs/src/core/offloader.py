@@ -4,20 +4,59 @@
 import os
 import sys
 import time
+import json
 import shutil
+import threading
 import subprocess
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+import dedup
+import subtree
+import transfer
+import rehydrate
+
 # [ CONFIG ]
 WATCH_ROOT = "/Users"
 ROAMING_ROOT = "/Mount/Roaming"
 THRESHOLD_PERCENT = 80  # Offload if usage > 80%
 CHECK_INTERVAL = 10     # Seconds between queue checks
+OFFLOADER_CONFIG = os.environ.get("ZENFS_OFFLOADER_CONFIG")
+DIR_OFFLOAD = {
+    "enabled": True,
+    "depth": 3,            # Tree unit below WATCH_ROOT: <user>/<folder>/<tree>
+    "min_files": 500,      # File events inside a unit before it is handled as a whole
+    "quiet_seconds": 120,  # No events or mtimes newer than this before copying
+    "workers": 8,          # Parallel file copiers per tree
+    "max_wait": 6 * 3600   # A unit still not offloaded after this long falls back to per-file mode
+}
+DIR_ACTIVITY_TTL = 3600  # Forget event counts of units idle this long
+PER_FILE = "per-file"    # offload_dir_job result: hand the unit's files to the per-file queue
 
 # Queue for files waiting to be processed (path -> timestamp)
 pending_queue = {}
+queue_lock = threading.Lock()
+in_flight = set()  # Paths handed to the scheduler, not yet finished
+pending_dirs = {}  # Tree units offloaded as one directory (path -> last event)
+dir_activity = {}  # Tree unit -> [file events, last event timestamp]
+dir_since = {}     # Tree unit -> when it entered directory mode
+per_file_units = {}  # Tree units sent back to per-file mode -> until when
+scheduler = None   # transfer.TransferScheduler, created in main()
+deduplicator = None  # dedup.Deduplicator, created in main() unless disabled
+tracker = None       # rehydrate.AccessTracker, created in main() unless disabled
+ledgers = rehydrate.Ledgers(ROAMING_ROOT)  # Which drive files back shadows, and whether we created them
+
+def load_config():
+    """Optional JSON config. Missing file means built-in defaults."""
+    if not OFFLOADER_CONFIG or not os.path.exists(OFFLOADER_CONFIG):
+        return {}
+    try:
+        with open(OFFLOADER_CONFIG, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Offloader] Config Error: {e}. Using defaults.")
+        return {}
 
 def is_dotfile(path):
     """Checks if file or any parent directory in relative path is hidden."""
@@ -62,27 +101,36 @@ def get_disk_usage(path="/"):
     except:
         return 0
 
-def find_best_target_drive(required_space):
-    """Finds the Roaming Drive with the most free space."""
-    candidates = []
-    
+def list_drives():
+    """Returns the paths of all attached Roaming Drives."""
     if not os.path.exists(ROAMING_ROOT):
-        return None
-
+        return []
+    drives = []
     for drive in os.listdir(ROAMING_ROOT):
         drive_path = os.path.join(ROAMING_ROOT, drive)
         if os.path.isdir(drive_path):
-            try:
-                # Check if it has a Users directory structure (ZenFS compliant)
-                # If not, we might create it, but prefer pre-minted drives.
-                # mint.py creates /Users on drives.
-                target_users_dir = os.path.join(drive_path, "Users")
-                
-                total, used, free = shutil.disk_usage(drive_path)
-                if free > required_space:
-                    candidates.append((free, drive_path))
-            except:
-                pass
+            drives.append(drive_path)
+    return drives
+
+def find_best_target_drive(required_space):
+    """Finds the Roaming Drive with the most free space."""
+    candidates = []
+    
+    for drive_path in list_drives():
+        try:
+            # Check if it has a Users directory structure (ZenFS compliant)
+            # If not, we might create it, but prefer pre-minted drives.
+            # mint.py creates /Users on drives.
+            target_users_dir = os.path.join(drive_path, "Users")
+            
+            total, used, free = shutil.disk_usage(drive_path)
+            # Bytes already queued for this drive are not on disk yet
+            if scheduler:
+                free -= scheduler.reserved(drive_path)
+            if free > required_space:
+                candidates.append((free, drive_path))
+        except:
+            pass
     
     # Sort by free space descending
     candidates.sort(key=lambda x: x[0], reverse=True)
@@ -91,9 +139,16 @@ def find_best_target_drive(required_space):
         return candidates[0][1] # Return path of best drive
     return None
 
-def offload_file(filepath):
-    """Moves file to external drive and symlinks back."""
-    
+def plan_offload(filepath):
+    """
+    Decides whether and where a file should be offloaded.
+    Returns True if there is nothing to do, False to retry later,
+    or a (target_drive, dest_path, file_size) plan.
+    """
+    # Already shadowed (our own symlink shows up as a create event)
+    if os.path.islink(filepath):
+        return True
+
     # 1. Check Threshold
     usage = get_disk_usage("/")
     if usage < THRESHOLD_PERCENT:
@@ -119,23 +174,28 @@ def offload_file(filepath):
     
     rel_path = os.path.relpath(filepath, WATCH_ROOT)
     dest_path = os.path.join(target_drive, "Users", rel_path)
-    dest_dir = os.path.dirname(dest_path)
+    return (target_drive, dest_path, file_size)
 
+def transfer_file(filepath, dest_path, file_size, bucket=None):
+    """Copies file to its target, verifies it and leaves a shadow symlink behind."""
     print(f"[Offloader] Offloading -> {dest_path}")
+    dest_dir = os.path.dirname(dest_path)
 
     try:
         os.makedirs(dest_dir, exist_ok=True)
         
-        # 4. Copy (preserve metadata)
-        shutil.copy2(filepath, dest_path)
+        # 4. Copy (preserve metadata, paced by the device bandwidth cap)
+        transfer.throttled_copy(filepath, dest_path, bucket)
         
         # 5. Verify Copy (Simple size check)
-        if os.path.getsize(dest_path) == file_size:
+        st = os.stat(filepath)
+        if os.path.getsize(dest_path) == file_size and st.st_size == file_size:
             # 6. Delete Original
             os.remove(filepath)
             
-            # 7. Symlink Back (Shadowing)
+            # 7. Symlink Back (Shadowing), owned like the file it stands in for
             os.symlink(dest_path, filepath)
+            os.lchown(filepath, st.st_uid, st.st_gid)
             print(f"[Offloader] Success. Shadow link created.")
             return True
         else:
@@ -147,6 +207,91 @@ def offload_file(filepath):
         print(f"[Offloader] Error moving file: {e}")
         return False
 
+def shadow_duplicate(filepath, existing_path, file_size, mtime):
+    """Replaces file with a shadow link to an identical copy already on a drive."""
+    try:
+        st = os.stat(filepath)
+        if st.st_size != file_size or st.st_mtime_ns != mtime:
+            # Changed while hashing; let the next cycle look at it again
+            return False
+        os.remove(filepath)
+        os.symlink(existing_path, filepath)
+        os.lchown(filepath, st.st_uid, st.st_gid)
+        print(f"[Offloader] Duplicate of {existing_path}. Shadow link created without copy.")
+        return True
+    except Exception as e:
+        print(f"[Offloader] Error linking duplicate: {e}")
+        return False
+
+def offload_job(filepath, target_drive, dest_path, file_size, bucket=None):
+    """Dedup stage followed by the actual transfer. Runs on a device worker."""
+    if deduplicator:
+        try:
+            mtime = os.stat(filepath).st_mtime_ns
+        except FileNotFoundError:
+            return True
+        # Only the owner's own tree on the drive: Users/<user>/
+        user = os.path.relpath(filepath, WATCH_ROOT).split(os.sep)[0]
+        existing = deduplicator.find_duplicate(filepath, file_size, list_drives(), os.path.join("Users", user, ""))
+        if existing:
+            ok = shadow_duplicate(filepath, existing, file_size, mtime)
+            if ok:
+                ledgers.reference(existing, filepath)
+            if ok and tracker:
+                tracker.register(filepath, existing)
+            return ok
+
+    ok = transfer_file(filepath, dest_path, file_size, bucket)
+    if ok:
+        ledgers.created(dest_path, filepath)
+    if ok and deduplicator:
+        deduplicator.record(target_drive, dest_path)
+    if ok and tracker:
+        tracker.register(filepath, dest_path)
+    return ok
+
+def offload_file(filepath):
+    """Moves file to external drive and symlinks back (synchronous)."""
+    plan = plan_offload(filepath)
+    if isinstance(plan, bool):
+        return plan
+    target_drive, dest_path, file_size = plan
+    return offload_job(filepath, target_drive, dest_path, file_size)
+
+def dir_unit(path):
+    """Returns the tree unit directory a path belongs to, or None."""
+    if not DIR_OFFLOAD["enabled"]:
+        return None
+    parts = os.path.relpath(path, WATCH_ROOT).split(os.sep)
+    depth = DIR_OFFLOAD["depth"]
+    if parts[0] == ".." or len(parts) <= depth:
+        return None
+    return os.path.join(WATCH_ROOT, *parts[:depth])
+
+def enqueue(path, reset):
+    """Queues a file, or folds it into its tree unit once the unit is busy enough."""
+    now = time.time()
+    unit = dir_unit(path)
+    with queue_lock:
+        if unit and per_file_units.get(unit, 0) < now:
+            per_file_units.pop(unit, None)
+            activity = dir_activity.setdefault(unit, [0, now])
+            activity[0] += 1
+            activity[1] = now
+            if unit in pending_dirs or activity[0] >= DIR_OFFLOAD["min_files"]:
+                if unit not in pending_dirs:
+                    print(f"[Offloader] Large tree detected: {unit}. Switching to directory mode.")
+                    prefix = unit + os.sep
+                    for p in [p for p in pending_queue if p.startswith(prefix) and p not in in_flight]:
+                        del pending_queue[p]
+                    dir_since[unit] = now
+                pending_dirs[unit] = now
+                return
+        if reset:
+            pending_queue[path] = now
+        else:
+            pending_queue.setdefault(path, now)
+
 class NewFileHandler(FileSystemEventHandler):
     def on_created(self, event):
         if event.is_directory: return
@@ -154,21 +299,33 @@ class NewFileHandler(FileSystemEventHandler):
         
         # Add to queue
         print(f"[Offloader] New file detected: {event.src_path}")
-        pending_queue[event.src_path] = time.time()
+        enqueue(event.src_path, reset=True)
 
     def on_modified(self, event):
         if event.is_directory: return
         # If modified, it might be growing (downloading). Reset timer/ensure in queue.
         if event.src_path not in pending_queue:
             if not is_dotfile(event.src_path):
-                pending_queue[event.src_path] = time.time()
+                enqueue(event.src_path, reset=False)
+
+def on_transfer_done(filepath, ok):
+    """Scheduler callback, runs on a device worker thread."""
+    with queue_lock:
+        in_flight.discard(filepath)
+        # Failed transfers stay queued and are retried next cycle
+        if ok:
+            pending_queue.pop(filepath, None)
 
 def process_queue():
-    """Iterates through pending files and processes them."""
-    # Create a copy of keys to allow modification of dict during iteration
-    for filepath in list(pending_queue.keys()):
-        if not os.path.exists(filepath):
-            del pending_queue[filepath]
+    """Iterates through pending files and hands ready ones to the scheduler."""
+    # Snapshot keys; workers and the watcher modify the queue concurrently
+    with queue_lock:
+        candidates = [p for p in pending_queue if p not in in_flight]
+
+    for filepath in candidates:
+        if not os.path.lexists(filepath):
+            with queue_lock:
+                pending_queue.pop(filepath, None)
             continue
             
         # Check if file is open
@@ -176,15 +333,180 @@ def process_queue():
             # Still busy, skip this cycle
             continue
             
-        # File is closed. Attempt offload.
-        # Note: offload_file returns True if processed (moved OR skipped due to low usage)
-        # Returns False if it failed/needs retry (e.g. no drive space)
-        if offload_file(filepath):
-            del pending_queue[filepath]
+        # File is closed. Decide where it goes.
+        # Note: plan_offload returns True if nothing to do (low usage, already shadowed)
+        # Returns False if it needs retry (e.g. no drive space)
+        plan = plan_offload(filepath)
+        if plan is True:
+            with queue_lock:
+                pending_queue.pop(filepath, None)
+            continue
+        if plan is False:
+            continue
+
+        target_drive, dest_path, file_size = plan
+        with queue_lock:
+            in_flight.add(filepath)
+        scheduler.submit(
+            target_drive, filepath, file_size,
+            lambda bucket, f=filepath, t=target_drive, d=dest_path, s=file_size: offload_job(f, t, d, s, bucket),
+            on_transfer_done
+        )
+
+def start_rehydrator(config):
+    """Starts access tracking and the worker that pulls hot files back to root."""
+    global tracker
+    cfg = dict(rehydrate.DEFAULTS)
+    cfg.update(config)
+    if not cfg["enabled"]:
+        return None
+    if cfg["below_percent"] is None:
+        # Leave a gap below the offload threshold so files don't ping-pong
+        cfg["below_percent"] = THRESHOLD_PERCENT - 10
+    tracker = rehydrate.AccessTracker(cfg["window"], cfg["min_hits"])
+    worker = rehydrate.Rehydrator(
+        tracker, cfg,
+        usage_func=lambda: get_disk_usage("/"),
+        busy_func=is_file_open,
+        drives_func=list_drives,
+        roots=(WATCH_ROOT, ROAMING_ROOT),
+        ledgers=ledgers
+    )
+    worker.start()
+    return worker
+
+def plan_dir_offload(unit, snap):
+    """Same contract as plan_offload, for a whole tree unit."""
+    if os.path.islink(unit) or not os.path.isdir(unit):
+        return True
+
+    usage = get_disk_usage("/")
+    if usage < THRESHOLD_PERCENT:
+        return True
+
+    print(f"[Offloader] Disk Usage {usage:.1f}% > {THRESHOLD_PERCENT}%. Triggering Tree Offload for {unit} ({snap.files} files)")
+    target_drive = find_best_target_drive(snap.bytes + 1024 * max(1, snap.files))
+    if not target_drive:
+        print("[Offloader] No suitable external drive found!")
+        return False
+
+    dest_path = os.path.join(target_drive, "Users", os.path.relpath(unit, WATCH_ROOT))
+    return (target_drive, dest_path, snap.bytes)
+
+def offload_dir_job(unit, dest_path, snap, bucket=None):
+    """Copies a quiet tree in parallel and replaces it with one directory symlink."""
+    if os.path.lexists(dest_path):
+        # Never merge into data we did not put there; offload the files one by one instead
+        print(f"[Offloader] {dest_path} already exists. Offloading {unit} file by file.")
+        return PER_FILE
+
+    print(f"[Offloader] Offloading tree -> {dest_path}")
+    try:
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        files, copied = subtree.parallel_copy(unit, dest_path, DIR_OFFLOAD["workers"], bucket)
+        # Anything written during the copy invalidates it
+        if files != snap.files or copied != snap.bytes or subtree.snapshot(unit) != snap:
+            print(f"[Offloader] {unit} changed during copy. Aborting.")
+            shutil.rmtree(dest_path, ignore_errors=True)
+            return False
+        subtree.swap_for_link(unit, dest_path)
+        print(f"[Offloader] Success. Tree shadow link created ({files} files).")
+        return True
+    except Exception as e:
+        print(f"[Offloader] Error moving tree: {e}")
+        shutil.rmtree(dest_path, ignore_errors=True)
+        return False
+
+def drop_unit(unit):
+    """Forgets a tree unit's directory-mode state. Caller holds queue_lock."""
+    pending_dirs.pop(unit, None)
+    dir_activity.pop(unit, None)
+    dir_since.pop(unit, None)
+
+def fall_back_to_files(unit):
+    """
+    Leaves directory mode for a unit and queues its files individually again
+    (enqueue dropped them when the unit switched). The unit stays in per-file
+    mode for DIR_ACTIVITY_TTL so its events do not fold it right back.
+    """
+    with queue_lock:
+        drop_unit(unit)
+        per_file_units[unit] = time.time() + DIR_ACTIVITY_TTL
+    now = time.time()
+    files = []
+    for dirpath, dirnames, filenames in os.walk(unit):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if not is_dotfile(path) and not os.path.islink(path):
+                files.append(path)
+    with queue_lock:
+        for path in files:
+            pending_queue.setdefault(path, now)
+    print(f"[Offloader] {unit}: {len(files)} files queued individually.")
+
+def on_dir_done(unit, ok):
+    with queue_lock:
+        in_flight.discard(unit)
+        if ok and ok != PER_FILE:
+            drop_unit(unit)
+    if ok == PER_FILE:
+        fall_back_to_files(unit)
+
+def process_dirs():
+    """Hands quiescent tree units to the scheduler as single transfers."""
+    now = time.time()
+    quiet = DIR_OFFLOAD["quiet_seconds"]
+    with queue_lock:
+        for unit in [u for u, a in dir_activity.items() if u not in pending_dirs and now - a[1] > DIR_ACTIVITY_TTL]:
+            del dir_activity[unit]
+        for unit in [u for u, until in per_file_units.items() if until < now]:
+            del per_file_units[unit]
+        # A unit that never goes quiet must not keep its files local forever
+        overdue = [u for u in pending_dirs if u not in in_flight and now - dir_since.get(u, now) > DIR_OFFLOAD["max_wait"]]
+        candidates = [(u, t) for u, t in pending_dirs.items()
+                      if u not in in_flight and u not in overdue and now - t >= quiet]
+
+    for unit in overdue:
+        print(f"[Offloader] {unit} has not gone quiet in {DIR_OFFLOAD['max_wait']}s. Falling back to per-file mode.")
+        fall_back_to_files(unit)
+
+    for unit, last_event in candidates:
+        snap = subtree.snapshot(unit)
+        # Quiescent: no recent writes and nothing holding files open
+        if now - snap.newest_mtime < quiet:
+            continue
+        if subtree.open_paths_under(unit):
+            continue
+
+        plan = plan_dir_offload(unit, snap)
+        if plan is True:
+            with queue_lock:
+                drop_unit(unit)
+            continue
+        if plan is False:
+            continue
+
+        target_drive, dest_path, total = plan
+        with queue_lock:
+            in_flight.add(unit)
+        scheduler.submit(
+            target_drive, unit, total,
+            lambda bucket, u=unit, d=dest_path, sn=snap: offload_dir_job(u, d, sn, bucket),
+            on_dir_done
+        )
 
 def main():
+    global scheduler, deduplicator
     print(f"::: ZenFS Offloader (Threshold: {THRESHOLD_PERCENT}%) :::")
     
+    config = load_config()
+    scheduler = transfer.TransferScheduler(config.get("transfers"))
+    DIR_OFFLOAD.update(config.get("directories", {}))
+    dedup_cfg = config.get("dedup", {})
+    if dedup_cfg.get("enabled", True):
+        deduplicator = dedup.Deduplicator(min_size=dedup_cfg.get("min_size", 1024 * 1024))
+
     observer = Observer()
     handler = NewFileHandler()
     
@@ -194,6 +516,7 @@ def main():
 
     observer.schedule(handler, WATCH_ROOT, recursive=True)
     observer.start()
+    start_rehydrator(config.get("rehydrate", {}))
     
     print(f"Watching {WATCH_ROOT}...")
     
@@ -201,8 +524,12 @@ def main():
         while True:
             time.sleep(CHECK_INTERVAL)
             process_queue()
+            process_dirs()
+            if deduplicator:
+                deduplicator.forget_missing()
     except KeyboardInterrupt:
         observer.stop()
+        scheduler.shutdown()
     observer.join()
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+######
+# scripts/core/prewarm.py
+######
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# [ CONSTANTS ]
+PREWARM_DIR = "/run/zenfs/prewarm"
+PREWARM_WORKERS = 8
+PREWARM_WAIT = 300  # Max seconds the indexer waits for a prewarm in progress
+SKIP_REL = {"System/ZenFS"}
+
+def is_rotational(dev_name):
+    """True if the disk behind a /dev name (partition or whole disk) is spinning media."""
+    sys_path = os.path.realpath(f"/sys/class/block/{dev_name}")
+    for path in (sys_path, os.path.dirname(sys_path)):
+        try:
+            with open(os.path.join(path, "queue/rotational"), 'r') as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+def listing_path(drive_uuid):
+    return os.path.join(PREWARM_DIR, f"{drive_uuid}.json")
+
+def reservation_path(root):
+    return os.path.join(PREWARM_DIR, os.path.normpath(root).strip('/').replace('/', '-') + ".pending")
+
+def reserve(root):
+    """
+    Marks root as about to be prewarmed. Taken before the drive is mounted
+    (its uuid is not known yet), so the indexer never starts its own walk
+    ahead of the listing. Returns False if the marker cannot be written.
+    """
+    try:
+        os.makedirs(PREWARM_DIR, exist_ok=True)
+        open(reservation_path(root), 'w').close()
+        return True
+    except OSError as e:
+        print(f"[Prewarm] Cannot reserve {root}: {e}")
+        return False
+
+def release(root):
+    try: os.remove(reservation_path(root))
+    except OSError: pass
+
+def _scan_dir(path):
+    """
+    Lists one directory and stats its entries in inode order, which on most
+    filesystems follows the on-disk inode table and keeps a spinning disk streaming.
+    Returns (dirs, files, subdirs_to_descend).
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return [], [], []
+    try:
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except (OSError, AttributeError):
+            pass
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.inode())
+    except OSError:
+        return [], [], []
+    finally:
+        os.close(fd)
+
+    dirs, files, descend = [], [], []
+    for entry in entries:
+        try:
+            entry.stat(follow_symlinks=False)
+            # Same split as os.walk: links to dirs are listed as dirs but not entered
+            if entry.is_dir():
+                dirs.append(entry.name)
+                if not entry.is_symlink() and not entry.name.startswith('.'):
+                    descend.append(entry.path)
+            else:
+                files.append(entry.name)
+        except OSError:
+            continue
+    return dirs, files, descend
+
+def prewarm(root, drive_uuid, workers=PREWARM_WORKERS):
+    """
+    Walks root breadth-first with parallel scandir and publishes the listing
+    for the Librarian's initial_scan. Returns the number of directories read.
+    """
+    os.makedirs(PREWARM_DIR, exist_ok=True)
+    final = listing_path(drive_uuid)
+    part = f"{final}.part"
+    try:
+        open(part, 'w').close()  # Tells the indexer a listing is on its way
+    finally:
+        release(root)  # The .part marker takes over from the reservation
+
+    start = time.monotonic()
+    tree = {}
+    level = [root]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while level:
+                next_level = []
+                for path, (dirs, files, descend) in zip(level, pool.map(_scan_dir, level)):
+                    rel = os.path.relpath(path, root)
+                    tree[rel] = [dirs, files]
+                    next_level.extend(d for d in descend if os.path.relpath(d, root) not in SKIP_REL)
+                level = next_level
+
+        with open(part, 'w') as f:
+            json.dump({"root": root, "created_at": time.time(), "tree": tree}, f)
+        os.replace(part, final)
+    except Exception as e:
+        print(f"[Prewarm] Failed for {root}: {e}")
+        try: os.remove(part)
+        except OSError: pass
+        return 0
+    print(f"[Prewarm] {root}: {len(tree)} directories in {time.monotonic() - start:.1f}s")
+    return len(tree)
+
+def start(root, drive_uuid, workers=PREWARM_WORKERS):
+    """Runs prewarm on a daemon thread, so the caller (a mount worker) is not held up by the walk."""
+    def run():
+        try:
+            prewarm(root, drive_uuid, workers)
+        except OSError as e:
+            print(f"[Prewarm] Failed for {root}: {e}")
+    thread = threading.Thread(target=run, name=f"prewarm-{drive_uuid}", daemon=True)
+    thread.start()
+    return thread
+
+def take_listing(root, drive_uuid, wait=PREWARM_WAIT):
+    """
+    Claims a published listing for root (waiting for one in progress).
+    Returns {rel: [dirs, files]} or None.
+    """
+    final = listing_path(drive_uuid)
+    reserved = reservation_path(root)
+    deadline = time.monotonic() + wait
+    while (os.path.exists(reserved) or os.path.exists(f"{final}.part")) and time.monotonic() < deadline:
+        time.sleep(0.5)
+    try:
+        with open(final, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Subtree rescans (moved dirs) must not consume the drive-wide listing
+    if data.get("root") != root:
+        return None
+    try: os.remove(final)
+    except OSError: pass
+    return data.get("tree")
+
+def walk_listing(root, tree):
+    """os.walk(root) replacement over a prewarmed tree; honours in-place pruning of dirnames."""
+    stack = ["."]
+    while stack:
+        rel = stack.pop()
+        entry = tree.get(rel)
+        if entry is None: continue
+        dirnames, filenames = list(entry[0]), list(entry[1])
+        dirpath = root if rel == "." else os.path.join(root, rel)
+        yield dirpath, dirnames, filenames
+        for d in reversed(dirnames):
+            stack.append(d if rel == "." else os.path.join(rel, d))
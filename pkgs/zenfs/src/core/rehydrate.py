@@ -0,0 +1,430 @@
+######
+# scripts/core/rehydrate.py
+######
+import os
+import time
+import shutil
+import socket
+import struct
+import ctypes
+import sqlite3
+import threading
+from collections import deque
+
+# [ CONSTANTS ]
+DEFAULTS = {
+    "enabled": True,
+    "source": "auto",        # auto | fanotify | atime
+    "min_hits": 3,           # Accesses inside window before a file counts as hot
+    "window": 86400,         # Seconds of access history considered
+    "interval": 300,         # Seconds between rehydration passes
+    "sample_interval": 600,  # Seconds between atime samples (atime source only)
+    "below_percent": None,   # Root usage ceiling after rehydration (default: threshold - 10)
+    "batch": 16              # Max files restored per pass
+}
+MAX_HITS = 64  # Per-file history cap
+LEDGER_NAME = "System/ZenFS/shadows.db"
+
+# fanotify(7)
+FAN_CLOEXEC = 0x01
+FAN_CLASS_NOTIF = 0x00
+FAN_MARK_ADD = 0x01
+FAN_MARK_MOUNT = 0x10
+FAN_OPEN = 0x20
+FAN_Q_OVERFLOW = 0x4000
+AT_FDCWD = -100
+EVENT_FORMAT = "=IBBHQii"
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+def host_id():
+    """Identifies this machine in the drive ledgers."""
+    try:
+        with open("/etc/machine-id", 'r') as f:
+            value = f.read().strip()
+        if value:
+            return value
+    except OSError:
+        pass
+    return socket.gethostname()
+
+class ShadowLedger:
+    """
+    Which files on one roaming drive back shadow links, kept on the drive
+    itself (System/ZenFS/shadows.db) so every host that uses it sees the same
+    picture. A file has an origin row only if an offloader copied it there;
+    files that lived on the drive natively have none. Every shadow pointing
+    at a file, on any host, is a ref.
+    """
+    def __init__(self, drive_root):
+        self.drive_root = drive_root
+        self.host = host_id()
+        self.lock = threading.Lock()
+        path = os.path.join(drive_root, LEDGER_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS origins (path TEXT PRIMARY KEY, host TEXT, created_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs (path TEXT, host TEXT, shadow TEXT, PRIMARY KEY (path, host, shadow))"
+        )
+        self.conn.commit()
+
+    def _rel(self, target):
+        return os.path.relpath(target, self.drive_root)
+
+    def created(self, target):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO origins (path, host, created_at) VALUES (?, ?, ?)",
+                (self._rel(target), self.host, time.time())
+            )
+            self.conn.commit()
+
+    def reference(self, target, shadow):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO refs (path, host, shadow) VALUES (?, ?, ?)",
+                (self._rel(target), self.host, shadow)
+            )
+            self.conn.commit()
+
+    def release(self, target, shadow):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM refs WHERE path = ? AND host = ? AND shadow = ?", (self._rel(target), self.host, shadow)
+            )
+            self.conn.commit()
+
+    def removable(self, target):
+        """True if an offloader created target and no shadow anywhere still points at it."""
+        rel = self._rel(target)
+        with self.lock:
+            owned = self.conn.execute("SELECT 1 FROM origins WHERE path = ?", (rel,)).fetchone()
+            refs = self.conn.execute("SELECT COUNT(*) FROM refs WHERE path = ?", (rel,)).fetchone()[0]
+        return owned is not None and refs == 0
+
+    def drop(self, target):
+        with self.lock:
+            self.conn.execute("DELETE FROM origins WHERE path = ?", (self._rel(target),))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class Ledgers:
+    """The ShadowLedger of whichever drive a target lives on, opened on first use."""
+    def __init__(self, roaming_root):
+        self.roaming_root = os.path.realpath(roaming_root)
+        self.open = {}
+        self.lock = threading.Lock()
+
+    def for_target(self, target):
+        rel = os.path.relpath(os.path.realpath(target), self.roaming_root)
+        if rel.startswith(".."):
+            return None
+        drive_root = os.path.join(self.roaming_root, rel.split(os.sep)[0])
+        with self.lock:
+            ledger = self.open.get(drive_root)
+            if ledger is None:
+                try:
+                    ledger = ShadowLedger(drive_root)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[Rehydrate] Cannot open shadow ledger on {drive_root}: {e}")
+                    return None
+                self.open[drive_root] = ledger
+        return ledger
+
+    def _apply(self, target, method, *args):
+        """Runs a ledger method; a failure drops the ledger (drive likely gone). Returns the result or None."""
+        ledger = self.for_target(target)
+        if ledger is None:
+            return None
+        try:
+            return getattr(ledger, method)(os.path.realpath(target), *args)
+        except sqlite3.Error as e:
+            print(f"[Rehydrate] Shadow ledger on {ledger.drive_root} failed: {e}")
+            with self.lock:
+                self.open.pop(ledger.drive_root, None)
+            return None
+
+    def created(self, target, shadow):
+        """An offloader copied target to the drive and left shadow behind."""
+        self._apply(target, "created")
+        self._apply(target, "reference", shadow)
+
+    def reference(self, target, shadow):
+        self._apply(target, "reference", shadow)
+
+    def release(self, target, shadow):
+        self._apply(target, "release", shadow)
+
+    def removable(self, target):
+        return bool(self._apply(target, "removable"))
+
+    def drop(self, target):
+        self._apply(target, "drop")
+
+class AccessTracker:
+    """Registry of shadowed files (drive target -> local shadows) plus their recent accesses."""
+    def __init__(self, window, min_hits):
+        self.window = window
+        self.min_hits = min_hits
+        self.shadows = {}
+        self.hits = {}
+        self.lock = threading.Lock()
+
+    def register(self, shadow_path, target_path):
+        target = os.path.realpath(target_path)
+        with self.lock:
+            self.shadows.setdefault(target, set()).add(shadow_path)
+
+    def forget(self, target):
+        with self.lock:
+            self.shadows.pop(target, None)
+            self.hits.pop(target, None)
+
+    def targets(self):
+        with self.lock:
+            return list(self.shadows)
+
+    def shadows_of(self, target):
+        with self.lock:
+            return set(self.shadows.get(target, ()))
+
+    def record(self, target, stamp=None):
+        with self.lock:
+            if target not in self.shadows: return
+            self.hits.setdefault(target, deque(maxlen=MAX_HITS)).append(stamp or time.time())
+
+    def hot(self):
+        """Targets with at least min_hits inside the window, hottest first."""
+        cutoff = time.time() - self.window
+        ranked = []
+        with self.lock:
+            for target, stamps in list(self.hits.items()):
+                while stamps and stamps[0] < cutoff:
+                    stamps.popleft()
+                if not stamps:
+                    del self.hits[target]
+                    continue
+                if len(stamps) >= self.min_hits:
+                    ranked.append((len(stamps), target))
+        ranked.sort(reverse=True)
+        return [t for _, t in ranked]
+
+    def discover(self, watch_root, roaming_root):
+        """Rebuilds the registry from shadow links already present under watch_root."""
+        count = 0
+        prefix = roaming_root.rstrip('/') + '/'
+        for dirpath, dirnames, filenames in os.walk(watch_root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if not os.path.islink(path): continue
+                    target = os.readlink(path)
+                except OSError:
+                    continue
+                if target.startswith(prefix) and os.path.isfile(target):
+                    self.register(path, target)
+                    count += 1
+        return count
+
+class FanotifySource(threading.Thread):
+    """Feeds open events on roaming drive mounts into the tracker. Needs CAP_SYS_ADMIN."""
+    def __init__(self, tracker, drives_func):
+        super().__init__(name="rehydrate-fanotify", daemon=True)
+        self.tracker = tracker
+        self.drives_func = drives_func
+        self.marked = set()
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.libc.fanotify_init.argtypes = [ctypes.c_uint, ctypes.c_uint]
+        self.libc.fanotify_mark.argtypes = [ctypes.c_int, ctypes.c_uint, ctypes.c_uint64, ctypes.c_int, ctypes.c_char_p]
+        self.fd = self.libc.fanotify_init(FAN_CLOEXEC | FAN_CLASS_NOTIF, os.O_RDONLY | getattr(os, "O_LARGEFILE", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "fanotify_init failed")
+        self.refresh_marks()
+
+    def refresh_marks(self):
+        """Marks newly attached drives. Marks vanish on their own at unmount."""
+        current = set(self.drives_func())
+        for drive in current - self.marked:
+            rc = self.libc.fanotify_mark(self.fd, FAN_MARK_ADD | FAN_MARK_MOUNT, FAN_OPEN, AT_FDCWD, drive.encode())
+            if rc == 0:
+                self.marked.add(drive)
+            else:
+                print(f"[Rehydrate] Cannot watch {drive}: {os.strerror(ctypes.get_errno())}")
+        self.marked &= current
+
+    def run(self):
+        own_pid = os.getpid()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * EVENT_SIZE)
+            except InterruptedError:
+                continue
+            except OSError as e:
+                print(f"[Rehydrate] fanotify read failed: {e}")
+                return
+            now = time.time()
+            offset = 0
+            while offset + EVENT_SIZE <= len(buf):
+                event_len, _, _, _, mask, efd, pid = struct.unpack_from(EVENT_FORMAT, buf, offset)
+                offset += event_len or EVENT_SIZE
+                if efd < 0:
+                    if mask & FAN_Q_OVERFLOW:
+                        print("[Rehydrate] fanotify queue overflow, some accesses were missed.")
+                    continue
+                try:
+                    # Our own copies and hashes are not user accesses
+                    if pid != own_pid:
+                        self.tracker.record(os.readlink(f"/proc/self/fd/{efd}"), now)
+                except OSError:
+                    pass
+                finally:
+                    os.close(efd)
+
+class AtimeSampler(threading.Thread):
+    """Fallback source: counts an access whenever a target's atime moved since the last sample."""
+    def __init__(self, tracker, interval):
+        super().__init__(name="rehydrate-atime", daemon=True)
+        self.tracker = tracker
+        self.interval = interval
+        self.last = {}
+
+    def sample(self):
+        now = time.time()
+        seen = {}
+        for target in self.tracker.targets():
+            try:
+                atime = os.stat(target).st_atime_ns
+            except OSError:
+                continue
+            seen[target] = atime
+            previous = self.last.get(target)
+            if previous is not None and atime > previous:
+                self.tracker.record(target, now)
+        self.last = seen
+
+    def run(self):
+        while True:
+            self.sample()
+            time.sleep(self.interval)
+
+def shadow_owner(shadow):
+    """(uid, gid) a restored file should get: the shadow link's, or its directory's if root made the link."""
+    st = os.lstat(shadow)
+    if st.st_uid == 0:
+        st = os.stat(os.path.dirname(shadow))
+    return st.st_uid, st.st_gid
+
+class Rehydrator(threading.Thread):
+    """
+    Pulls hot files back from roaming drives while root has room.
+    Restores happen as copy -> temp sibling -> rename over the shadow link, so
+    readers never see a missing file. The drive copy is removed afterwards,
+    but only if an offloader created it and no other shadow (of any host)
+    still points at it; see ShadowLedger.
+    """
+    def __init__(self, tracker, config, usage_func, busy_func, drives_func=None, roots=None, ledgers=None):
+        super().__init__(name="rehydrate-worker", daemon=True)
+        self.tracker = tracker
+        self.config = config
+        self.usage_func = usage_func
+        self.busy_func = busy_func
+        self.drives_func = drives_func
+        self.roots = roots  # (watch_root, roaming_root) to rediscover existing shadows
+        self.ledgers = ledgers
+        self.source = None
+
+    def start_source(self):
+        kind = self.config.get("source", "auto")
+        if kind in ("auto", "fanotify") and self.drives_func:
+            try:
+                self.source = FanotifySource(self.tracker, self.drives_func)
+                self.source.start()
+                print("[Rehydrate] Tracking accesses via fanotify.")
+                return
+            except (OSError, AttributeError) as e:
+                if kind == "fanotify":
+                    print(f"[Rehydrate] fanotify unavailable ({e}). Access tracking disabled.")
+                    return
+                print(f"[Rehydrate] fanotify unavailable ({e}). Falling back to atime sampling.")
+        self.source = AtimeSampler(self.tracker, self.config.get("sample_interval", DEFAULTS["sample_interval"]))
+        self.source.start()
+
+    def restore(self, target):
+        """Replaces every shadow of target with a local copy. Returns bytes restored."""
+        shadows = [s for s in self.tracker.shadows_of(target) if os.path.islink(s) and os.path.realpath(s) == target]
+        if not shadows:
+            self.tracker.forget(target)
+            return 0
+        if self.busy_func(target):
+            return 0
+        size = os.path.getsize(target)
+        for shadow in shadows:
+            tmp = os.path.join(os.path.dirname(shadow), f".{os.path.basename(shadow)}.zenfs-rehydrate")
+            try:
+                uid, gid = shadow_owner(shadow)
+                shutil.copy2(target, tmp)
+                if os.path.getsize(tmp) != size:
+                    raise OSError("size mismatch after copy")
+                # The copy is made as root; give it back to whoever owned the file
+                os.chown(tmp, uid, gid)
+                os.replace(tmp, shadow)
+                print(f"[Rehydrate] Restored {shadow} to local disk.")
+            except OSError as e:
+                print(f"[Rehydrate] Failed to restore {shadow}: {e}")
+                if os.path.exists(tmp):
+                    try: os.remove(tmp)
+                    except OSError: pass
+                return 0
+            if self.ledgers:
+                self.ledgers.release(target, shadow)
+        if self.ledgers and self.ledgers.removable(target):
+            try:
+                os.remove(target)
+                self.ledgers.drop(target)
+            except OSError as e:
+                print(f"[Rehydrate] Could not remove drive copy {target}: {e}")
+        else:
+            print(f"[Rehydrate] Keeping {target} on the drive (not ours, or still referenced).")
+        self.tracker.forget(target)
+        return size * len(shadows)
+
+    def run_once(self):
+        ceiling = self.config["below_percent"]
+        total = shutil.disk_usage("/").total
+        for target in self.tracker.hot()[:self.config.get("batch", DEFAULTS["batch"])]:
+            try:
+                size = os.path.getsize(target) * len(self.tracker.shadows_of(target))
+            except OSError:
+                continue
+            usage = self.usage_func()
+            if usage >= ceiling:
+                break
+            # Skip files that would push root back over the ceiling
+            if usage + size / total * 100 >= ceiling:
+                continue
+            self.restore(target)
+
+    def run(self):
+        if self.roots:
+            count = self.tracker.discover(*self.roots)
+            print(f"[Rehydrate] Tracking {count} existing shadow links.")
+            if self.ledgers:
+                for target in self.tracker.targets():
+                    for shadow in self.tracker.shadows_of(target):
+                        self.ledgers.reference(target, shadow)
+        self.start_source()
+        interval = self.config.get("interval", DEFAULTS["interval"])
+        while True:
+            time.sleep(interval)
+            if isinstance(self.source, FanotifySource):
+                self.source.refresh_marks()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Rehydrate] Pass failed: {e}")
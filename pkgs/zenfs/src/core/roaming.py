@@ -9,6 +9,7 @@ import sys
 import pwd
 import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Import notify
 sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
@@ -18,41 +19,54 @@ except ImportError:
     print("[Nomad] Warning: notify module not found. Notifications disabled.")
     notify = None
 
+import devmon
+import idcache
+import prewarm
+import blockdev
+
 # [ CONSTANTS ]
 MOUNT_ROOT = "/Drives/Roaming"
+POLL_INTERVAL = 2  # Fallback when no uevent socket is available
+FAT_LIKE = ['vfat', 'exfat', 'ntfs', 'ntfs-3g', 'msdos']
+UNMOUNTABLE = {'swap', 'LVM2_member', 'crypto_LUKS', 'linux_raid_member', 'zfs_member', 'bcache'}
+MOUNT_WORKERS = 4     # Drives probed/mounted concurrently
+MOUNT_TIMEOUT = 30    # Seconds before a mount/umount call is killed
+MAX_ATTEMPTS = 5      # Failed mounts retried before giving up until re-plug
+RETRY_BASE = 2        # Backoff: RETRY_BASE * 2^(attempt-1) seconds ...
+RETRY_MAX = 120       # ... capped here
+STATUS_FILE = "/run/zenfs/nomad.json"
+PREWARM = os.environ.get("ZENFS_PREWARM", "auto")  # auto (rotational only) | always | off
 
 # [ STATE ]
 processing_uuids = set()
 processing_lock = threading.Lock()
 logged_skips = set()
 last_device_state = set() # Cache for state diffing
+foreign_cache = idcache.ForeignDriveCache() # Drives probed before and found not to be ours
+mount_pool = ThreadPoolExecutor(max_workers=MOUNT_WORKERS, thread_name_prefix="nomad-mount")
+mount_jobs = {}       # uuid -> (Future, cancel Event)
+mount_stats = {}      # uuid -> attempts, failures, last result/reason, mount time
+retry_at = {}         # uuid -> monotonic time before which no new attempt is made
+reconcile_lock = threading.Lock()
 
-def run_command(cmd):
+def run_command(cmd, timeout=MOUNT_TIMEOUT):
+    """Runs an argv list. Returns (ok, stdout, stderr); a timeout counts as failure."""
     try:
         result = subprocess.run(
-            cmd, check=True, shell=True, 
+            cmd, check=True, timeout=timeout,
             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
         )
         return True, result.stdout, ""
     except subprocess.CalledProcessError as e:
         return False, e.stdout, e.stderr
+    except subprocess.TimeoutExpired:
+        return False, "", f"Timed out after {timeout}s: {' '.join(cmd)}"
+    except OSError as e:
+        return False, "", str(e)
 
 def get_block_devices():
     try:
-        output = subprocess.check_output(
-            ["lsblk", "-J", "-o", "NAME,UUID,LABEL,FSTYPE,MOUNTPOINT"],
-            text=True
-        )
-        data = json.loads(output)
-        devices = []
-        for device in data.get("blockdevices", []):
-            def extract(node):
-                if node.get("uuid") and node.get("fstype"):
-                    devices.append(node)
-                for child in node.get("children", []):
-                    extract(child)
-            extract(device)
-        return devices
+        return [d for d in blockdev.flatten(blockdev.scan()) if d.get("uuid") and d.get("fstype")]
     except Exception as e:
         print(f"[Nomad] Error scanning devices: {e}")
         return []
@@ -92,46 +106,168 @@ def provision_users(drive_root):
     except Exception:
         pass
 
-def handle_drive(uuid, dev_name, mount_point, fstype):
+def device_generation(dev):
+    """Identity of the filesystem beyond its UUID; changes on relabel/resize/reformat."""
+    return f"{dev.get('fstype')}:{dev.get('size')}:{dev.get('label') or ''}"
+
+def read_diskseq(dev_name):
+    """Kernel disk sequence number (5.15+), unique per attachment. None if unsupported."""
+    sys_path = f"/sys/class/block/{dev_name}"
+    # Partitions inherit the diskseq of their parent disk
+    for path in (sys_path, os.path.dirname(os.path.realpath(sys_path))):
+        try:
+            with open(os.path.join(path, "diskseq"), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+class Cancelled(Exception):
+    pass
+
+def handle_drive(uuid, dev_name, mount_point, fstype, generation=None, diskseq=None, cancel=None):
+    """
+    Probes and mounts one filesystem. Returns (result, reason) where result is
+    "mounted", "rejected" or "failed". Raises Cancelled if the device went away.
+    """
+    # Reserved before the mount, so the Librarian never starts its own walk first
+    warm = PREWARM == "always" or (PREWARM == "auto" and prewarm.is_rotational(dev_name))
+    warm = warm and prewarm.reserve(mount_point)
     try:
-        print(f"[Nomad] Worker started for {uuid} ({dev_name}) [{fstype}]...")
-        dev_path = f"/dev/{dev_name}"
-        if not os.path.exists(mount_point):
-            os.makedirs(mount_point)
-            
-        cmd = f"mount {dev_path} {mount_point}"
-        if fstype in ['vfat', 'exfat', 'ntfs', 'ntfs-3g', 'msdos']:
-            cmd += " -o umask=000"
-        
-        success, out, err = run_command(cmd)
+        result, reason = probe_and_mount(uuid, dev_name, mount_point, fstype, generation, diskseq, cancel)
+    except BaseException:
+        if warm: prewarm.release(mount_point)
+        raise
+    if warm:
+        if result == "mounted":
+            # Off the mount worker: other drives keep mounting, the mount time stays honest
+            prewarm.start(mount_point, reason)
+        else:
+            prewarm.release(mount_point)
+    return result, reason
+
+def probe_and_mount(uuid, dev_name, mount_point, fstype, generation=None, diskseq=None, cancel=None):
+    """handle_drive without the prewarm bookkeeping."""
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+
+    print(f"[Nomad] Worker started for {uuid} ({dev_name}) [{fstype}]...")
+    dev_path = f"/dev/{dev_name}"
+    if not os.path.exists(mount_point):
+        os.makedirs(mount_point)
         
-        if success:
+    cmd = ["mount", dev_path, mount_point]
+    if fstype in FAT_LIKE:
+        cmd += ["-o", "umask=000"]
+    
+    # Identity probe: read-only, so rejected drives are never written to
+    success, out, err = run_command(cmd + ["-o", "ro"])
+    
+    if not success:
+        try: os.rmdir(mount_point)
+        except: pass
+        return "failed", err.strip()
+
+    try:
+        check_cancel()
+        identity = read_identity(mount_point)
+        if identity and identity.get("uuid") and identity.get("type") == "roaming":
+            zen_id = identity.get("uuid")
+            print(f"[Nomad] Valid ZenFS Roaming Drive: {zen_id}")
+            success, out, err = run_command(["mount", "-o", "remount,rw", mount_point])
+            if not success:
+                # Some drivers (e.g. FUSE ntfs-3g) cannot flip to rw in place
+                run_command(["umount", mount_point])
+                check_cancel()
+                success, out, err = run_command(cmd)
+            if not success:
+                return "failed", f"read-write mount: {err.strip()}"
+
             try: os.chmod(mount_point, 0o777)
             except: pass
-            
-            identity = read_identity(mount_point)
-            if identity and identity.get("uuid") and identity.get("type") == "roaming":
-                zen_id = identity.get("uuid")
-                print(f"[Nomad] Valid ZenFS Roaming Drive: {zen_id}")
-                provision_users(mount_point)
-                if notify:
-                    notify.send("ZenOS Nomad", f"Drive Mounted: {zen_id}", icon="drive-harddisk")
+            provision_users(mount_point)
+            if notify:
+                notify.send("ZenOS Nomad", f"Drive Mounted: {zen_id}", icon="drive-harddisk",
+                            category="nomad.mounted", source="nomad", summary="{count} drives mounted")
+            return "mounted", zen_id
+
+        reason = "No Identity" if not identity else f"Invalid Type ({identity.get('type')})"
+        print(f"[Nomad] Rejecting {uuid}: {reason}. Unmounting...")
+        run_command(["umount", mount_point])
+        try: os.rmdir(mount_point)
+        except: pass
+        if generation:
+            foreign_cache.reject(uuid, generation, reason, diskseq)
+        return "rejected", reason
+    except Cancelled:
+        run_command(["umount", mount_point])
+        try: os.rmdir(mount_point)
+        except: pass
+        raise
+
+def write_status():
+    """Publishes per-drive mount results for tooling (volatile, under /run)."""
+    try:
+        os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
+        tmp = f"{STATUS_FILE}.tmp"
+        with processing_lock:
+            snapshot = json.dumps(mount_stats, indent=2)
+        with open(tmp, 'w') as f:
+            f.write(snapshot)
+        os.replace(tmp, STATUS_FILE)
+    except OSError:
+        pass
+
+def mount_job(uuid, dev_name, mount_point, fstype, generation, diskseq, cancel):
+    """Pool entry point: runs handle_drive, records the outcome, schedules retries."""
+    start = time.monotonic()
+    try:
+        result, reason = handle_drive(uuid, dev_name, mount_point, fstype, generation, diskseq, cancel)
+    except Cancelled:
+        result, reason = "cancelled", "Device removed"
+    except Exception as e:
+        result, reason = "failed", str(e)
+    elapsed = time.monotonic() - start
+
+    retry_delay = None
+    with processing_lock:
+        stats = mount_stats.setdefault(uuid, {"attempts": 0, "failures": 0})
+        stats["attempts"] += 1
+        stats["result"] = result
+        stats["reason"] = reason
+        stats["device"] = dev_name
+        stats["seconds"] = round(elapsed, 3)
+        stats["updated_at"] = time.time()
+        if result == "failed":
+            stats["failures"] += 1
+            if stats["failures"] < MAX_ATTEMPTS:
+                retry_delay = min(RETRY_MAX, RETRY_BASE * 2 ** (stats["failures"] - 1))
+                retry_at[uuid] = time.monotonic() + retry_delay
             else:
-                reason = "No Identity" if not identity else f"Invalid Type ({identity.get('type')})"
-                print(f"[Nomad] Rejecting {uuid}: {reason}. Unmounting...")
-                run_command(f"umount {mount_point}")
-                try: os.rmdir(mount_point)
-                except: pass
+                # Parked until the device disappears and comes back
+                retry_at[uuid] = float("inf")
         else:
-            print(f"[Nomad] Failed to mount {uuid}. Error: {err.strip()}")
+            retry_at.pop(uuid, None)
+        processing_uuids.discard(uuid)
+        mount_jobs.pop(uuid, None)
 
-    except Exception as e:
-        print(f"[Nomad] Worker failed for {uuid}: {e}")
-    finally:
-        with processing_lock:
-            processing_uuids.discard(uuid)
+    if result == "failed":
+        print(f"[Nomad] Failed to mount {uuid} ({stats['failures']}/{MAX_ATTEMPTS}). Error: {reason}")
+        if retry_delay is not None:
+            timer = threading.Timer(retry_delay, reconcile, kwargs={"verbose": True})
+            timer.daemon = True
+            timer.start()
+    elif result != "cancelled":
+        print(f"[Nomad] {uuid}: {result} in {elapsed:.2f}s.")
+    write_status()
 
 def reconcile(verbose=False):
+    # Event loop and retry timers may both land here
+    with reconcile_lock:
+        _reconcile(verbose)
+
+def _reconcile(verbose):
     global last_device_state
     
     current_devices = get_block_devices()
@@ -169,24 +305,48 @@ def reconcile(verbose=False):
                     print(f"[Nomad] Skipping {uuid}: External mount.")
                 logged_skips.add(uuid)
             continue
+
+        # Known foreign filesystems are not mounted again
+        generation = device_generation(dev)
+        diskseq = read_diskseq(name)
+        reason = "Not mountable" if fstype in UNMOUNTABLE else foreign_cache.lookup(uuid, generation, diskseq)
+        if reason:
+            if uuid not in logged_skips:
+                print(f"[Nomad] Skipping {uuid}: Foreign drive ({reason}).")
+                logged_skips.add(uuid)
+            continue
             
         with processing_lock:
             if uuid in processing_uuids: continue
+            # Backing off after a failed mount
+            if retry_at.get(uuid, 0) > time.monotonic(): continue
             
             if uuid in logged_skips: logged_skips.remove(uuid)
 
             processing_uuids.add(uuid)
-            t = threading.Thread(
-                target=handle_drive, 
-                args=(uuid, name, target_mount, fstype), 
-                daemon=True
+            cancel = threading.Event()
+            future = mount_pool.submit(
+                mount_job, uuid, name, target_mount, fstype, generation, diskseq, cancel
             )
-            t.start()
+            mount_jobs[uuid] = (future, cancel)
             
     for u in list(logged_skips):
         if u not in current_scan_uuids:
             logged_skips.remove(u)
 
+    # Devices that vanished: cancel their pending work and reset their backoff
+    with processing_lock:
+        for u in [u for u in mount_jobs if u not in current_scan_uuids]:
+            future, cancel = mount_jobs[u]
+            cancel.set()
+            if future.cancel():
+                print(f"[Nomad] Cancelled queued mount for {u}: device removed.")
+                processing_uuids.discard(u)
+                del mount_jobs[u]
+        for u in [u for u in retry_at if u not in current_scan_uuids]:
+            del retry_at[u]
+            mount_stats.pop(u, None)
+
     if os.path.exists(MOUNT_ROOT):
         for item in os.listdir(MOUNT_ROOT):
             path = os.path.join(MOUNT_ROOT, item)
@@ -196,20 +356,41 @@ def reconcile(verbose=False):
                         try: os.rmdir(path)
                         except: pass
 
-def main():
+def watch(monitor):
+    """Event loop: reconcile only when the kernel reports block or mount changes."""
+    while True:
+        events = monitor.wait()
+        if events:
+            blockdev.invalidate()
+            reconcile(verbose=False)
+
+def poll():
+    """Legacy loop for kernels/sandboxes without a uevent socket."""
+    while True:
+        reconcile(verbose=False)
+        time.sleep(POLL_INTERVAL)
+
+def main(monitor=None):
     sys.stdout.reconfigure(line_buffering=True)
     print("::: ZenFS Nomad (Smart Mode) Started :::")
     
     if not os.path.exists(MOUNT_ROOT):
         os.makedirs(MOUNT_ROOT)
-        
+
+    # Subscribe before the first scan so nothing plugged in meanwhile is missed
+    if monitor is None:
+        monitor = devmon.DeviceMonitor.system()
     reconcile(verbose=True)
     
     try:
-        while True:
-            reconcile(verbose=False)
-            time.sleep(2)
+        if monitor:
+            print("[Nomad] Listening for device events.")
+            watch(monitor)
+        else:
+            print(f"[Nomad] Falling back to polling every {POLL_INTERVAL}s.")
+            poll()
     except KeyboardInterrupt:
+        mount_pool.shutdown(wait=False, cancel_futures=True)
         print("\n[Nomad] Stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+######
+# scripts/core/subtree.py
+######
+import os
+import stat
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import transfer
+
+class Snapshot:
+    """Cheap fingerprint of a directory tree, used to prove it stayed quiet."""
+    def __init__(self, files=0, total_bytes=0, newest_mtime=0.0, signature=0):
+        self.files = files
+        self.bytes = total_bytes
+        self.newest_mtime = newest_mtime
+        self.signature = signature
+
+    def __eq__(self, other):
+        return (self.files, self.bytes, self.signature) == (other.files, other.bytes, other.signature)
+
+def walk(root):
+    """Yields (path, dirs, files, symlinks) per directory, scandir based, no link following."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        dirs, files, links = [], [], []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_symlink():
+                        links.append(entry)
+                    elif entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry)
+                    else:
+                        files.append(entry)
+        except OSError:
+            continue
+        stack.extend(d.path for d in dirs)
+        yield current, dirs, files, links
+
+def snapshot(root):
+    snap = Snapshot()
+    signature = 0
+    for current, dirs, files, links in walk(root):
+        for entries, counted in ((files, True), (links, False), (dirs, False)):
+            for entry in entries:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if counted:
+                    snap.files += 1
+                    snap.bytes += st.st_size
+                snap.newest_mtime = max(snap.newest_mtime, st.st_mtime)
+                signature ^= hash((entry.path, st.st_size, st.st_mtime_ns))
+    snap.signature = signature
+    return snap
+
+def open_paths_under(root):
+    """
+    Open files (and working directories) of any process below root.
+    One pass over /proc instead of an lsof per file.
+    """
+    prefix = os.path.realpath(root).rstrip('/') + '/'
+    hits = []
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return hits
+    for pid in pids:
+        base = f"/proc/{pid}"
+        try:
+            targets = [os.readlink(f"{base}/cwd")]
+        except OSError:
+            targets = []
+        try:
+            for fd in os.listdir(f"{base}/fd"):
+                try: targets.append(os.readlink(f"{base}/fd/{fd}"))
+                except OSError: pass
+        except OSError:
+            pass
+        hits.extend(t for t in targets if t.startswith(prefix) or t == prefix[:-1])
+    return hits
+
+def copy_owner(src, dst):
+    """Gives dst the owner of src. The copy runs as root; chown drops setuid/setgid, so the mode is reapplied."""
+    st = os.lstat(src)
+    os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=False)
+    if not stat.S_ISLNK(st.st_mode) and st.st_mode & (stat.S_ISUID | stat.S_ISGID):
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+
+def parallel_copy(src_root, dst_root, workers=8, bucket=None):
+    """
+    Copies a tree with a pool of file copiers. Directories are created first,
+    symlinks are recreated as-is, directory metadata is applied last.
+    Ownership is carried over for everything. Returns (files, bytes) copied.
+    """
+    os.makedirs(dst_root)
+    dirs = [(src_root, dst_root)]
+    jobs = []
+    for current, subdirs, files, links in walk(src_root):
+        rel = os.path.relpath(current, src_root)
+        dst_dir = os.path.normpath(os.path.join(dst_root, rel))
+        for d in subdirs:
+            target = os.path.join(dst_dir, d.name)
+            os.mkdir(target)
+            dirs.append((d.path, target))
+        for link in links:
+            target = os.path.join(dst_dir, link.name)
+            os.symlink(os.readlink(link.path), target)
+            copy_owner(link.path, target)
+        for f in files:
+            jobs.append((f.path, os.path.join(dst_dir, f.name)))
+
+    def copy_one(job):
+        transfer.throttled_copy(job[0], job[1], bucket)
+        copy_owner(job[0], job[1])
+        return os.path.getsize(job[1])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        copied = sum(pool.map(copy_one, jobs))
+
+    # Deepest first so child creation does not bump parent mtimes again
+    for src, dst in reversed(dirs):
+        copy_owner(src, dst)
+        shutil.copystat(src, dst)
+    return len(jobs), copied
+
+def swap_for_link(path, dest):
+    """Replaces directory path with a symlink to dest, restoring it if linking fails."""
+    parent, name = os.path.split(path.rstrip('/'))
+    old = os.path.join(parent, f".{name}.zenfs-old")
+    os.rename(path, old)
+    try:
+        os.symlink(dest, path, target_is_directory=True)
+    except OSError:
+        os.rename(old, path)
+        raise
+    copy_owner(old, path)
+    shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,185 @@
+######
+# scripts/core/transfer.py
+######
+import os
+import time
+import shutil
+import threading
+import itertools
+from collections import deque
+
+# [ CONSTANTS ]
+SMALL_FILE_BYTES = 64 * 1024 * 1024  # Jobs at or below this size may use the express lane
+COPY_CHUNK = 4 * 1024 * 1024
+DEFAULT_LIMITS = {
+    "workers": 2,       # Concurrent general transfers per device
+    "bandwidth_mb": 0,  # MB/s cap shared by every worker of a device (0 = unlimited)
+    "express": True     # Dedicated lane so small files bypass large in-flight copies
+}
+
+class TokenBucket:
+    """
+    Byte-rate limiter shared by all workers writing to one device.
+    Runs in debt mode: a consumer may overdraw and then sleeps off the deficit
+    outside the lock, so concurrent writers interleave instead of serialising.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate: return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait: time.sleep(wait)
+
+def throttled_copy(src, dst, bucket=None):
+    """shutil.copy2 equivalent that paces writes through a device bucket."""
+    if bucket is None or not bucket.rate:
+        return shutil.copy2(src, dst)
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while True:
+            buf = fsrc.read(COPY_CHUNK)
+            if not buf: break
+            bucket.consume(len(buf))
+            fdst.write(buf)
+    shutil.copystat(src, dst)
+    return dst
+
+class Transfer:
+    def __init__(self, key, size, func, callback, seq):
+        self.key = key
+        self.size = size
+        self.func = func          # func(bucket) -> result
+        self.callback = callback  # callback(key, ok); ok is func's result as-is (falsy = failed)
+        self.seq = seq
+        self.queued_at = time.monotonic()
+
+class DeviceQueue:
+    """
+    Worker pool bound to a single target device.
+    General workers drain jobs in arrival order; the express worker only
+    takes small jobs, so they never wait behind a multi-GB copy.
+    """
+    def __init__(self, name, limits):
+        self.name = name
+        self.workers = max(1, int(limits.get("workers", 1)))
+        self.bucket = TokenBucket(float(limits.get("bandwidth_mb", 0)) * 1024 * 1024)
+        self.small_bytes = int(limits.get("small_file_bytes", SMALL_FILE_BYTES))
+        self.small = deque()
+        self.large = deque()
+        self.cond = threading.Condition()
+        self.reserved = 0  # Bytes queued or in flight, not yet visible in disk_usage
+        self.stopped = False
+        self.threads = []
+        for i in range(self.workers):
+            self._spawn(f"{name}-{i}", express=False)
+        if limits.get("express", True):
+            self._spawn(f"{name}-express", express=True)
+
+    def _spawn(self, thread_name, express):
+        t = threading.Thread(target=self._worker, args=(express,), name=f"transfer-{thread_name}", daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def put(self, job):
+        with self.cond:
+            self.reserved += job.size
+            (self.small if job.size <= self.small_bytes else self.large).append(job)
+            self.cond.notify_all()
+
+    def _take(self, express):
+        if express:
+            return self.small.popleft() if self.small else None
+        if self.small and self.large:
+            lane = self.small if self.small[0].seq < self.large[0].seq else self.large
+            return lane.popleft()
+        if self.small: return self.small.popleft()
+        if self.large: return self.large.popleft()
+        return None
+
+    def _worker(self, express):
+        while True:
+            with self.cond:
+                job = self._take(express)
+                while job is None:
+                    if self.stopped: return
+                    self.cond.wait()
+                    job = self._take(express)
+
+            ok = False
+            try:
+                ok = job.func(self.bucket)
+            except Exception as e:
+                print(f"[Transfer] {self.name}: job {job.key} failed: {e}")
+            finally:
+                with self.cond:
+                    self.reserved -= job.size
+            if job.callback:
+                try: job.callback(job.key, ok)
+                except Exception as e:
+                    print(f"[Transfer] {self.name}: callback for {job.key} failed: {e}")
+
+    def depth(self):
+        with self.cond:
+            return len(self.small) + len(self.large)
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+class TransferScheduler:
+    """
+    Routes transfers to one DeviceQueue per target device.
+    limits: {"defaults": {...}, "devices": {"<drive dir name>": {...}}}
+    """
+    def __init__(self, limits=None):
+        limits = limits or {}
+        self.defaults = dict(DEFAULT_LIMITS)
+        self.defaults.update(limits.get("defaults", {}))
+        self.overrides = limits.get("devices", {})
+        self.devices = {}
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+
+    def _queue(self, device):
+        with self.lock:
+            q = self.devices.get(device)
+            if q is None:
+                name = os.path.basename(device.rstrip('/')) or device
+                cfg = dict(self.defaults)
+                cfg.update(self.overrides.get(name, {}))
+                q = DeviceQueue(name, cfg)
+                self.devices[device] = q
+            return q
+
+    def submit(self, device, key, size, func, callback=None):
+        job = Transfer(key, size, func, callback, next(self.seq))
+        self._queue(device).put(job)
+        return job
+
+    def reserved(self, device):
+        with self.lock:
+            q = self.devices.get(device)
+        if q is None: return 0
+        with q.cond:
+            return q.reserved
+
+    def depth(self):
+        with self.lock:
+            queues = list(self.devices.values())
+        return sum(q.depth() for q in queues)
+
+    def shutdown(self):
+        with self.lock:
+            queues = list(self.devices.values())
+            self.devices.clear()
+        for q in queues:
+            q.stop()
@@ -4,15 +4,23 @@
 import os
 import sys
 import json
-import shutil
 import time
+import stat
+import heapq
 import logging
+import argparse
+import threading
 from pathlib import Path
 from datetime import datetime
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
 
 # Import shared notify module
 sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
 import notify
+import rules as rule_engine
+from mover import Mover
+from sniff import Sniffer
 
 # [ CONFIG ]
 CONFIG_PATH = os.environ.get("JANITOR_CONFIG")
@@ -24,22 +32,82 @@ def load_config():
         return json.load(f)['dumb']
 
 def get_destination(extension, rules):
-    """Finds the destination folder key for a given extension."""
+    """Finds the destination folder key for a given extension (classic rules only, see rules.RuleSet)."""
     ext = extension.lower().strip('.')
     for folder, extensions in rules.items():
         if ext in extensions:
             return folder
     return None
 
-def main():
-    try:
-        config = load_config()
-    except Exception as e:
-        print(f"Janitor Config Error: {e}")
+def _log_failure(item, what):
+    def done(future):
+        if future.exception() is not None:
+            print(f"Error {what} {item.name}: {future.exception()}")
+    return done
+
+def move_to_gate(item, watch_dir, dest_key, mover):
+    """
+    [ LOGIC ] Matched Rule -> Move to Gate
+    Returns the mover's Future, or None if the gate cannot be created.
+    """
+    user_root = watch_dir.parent
+    target_dir = user_root / dest_key
+    
+    if not target_dir.exists():
+        try:
+            target_dir.mkdir(parents=True, exist_ok=True)
+        except PermissionError:
+            return None
+
+    # Taken names get a _N suffix, picked by the mover's name index
+    print(f"[Dumb Janitor] Moving {item.name} -> {dest_key}")
+    future = mover.move(str(item), str(target_dir))
+    future.add_done_callback(_log_failure(item, "moving"))
+    return future
+
+def batch_unmatched(parent, files, mover):
+    """[ SPEC 2.2 ] The Cluster Protocol: group unmatched files into bursts."""
+    if not files:
         return
+        
+    # Create Waiting Gate
+    waiting_dir = parent / "Waiting"
+    if not waiting_dir.exists():
+        waiting_dir.mkdir(exist_ok=True)
+        
+    # Simple Clustering: If we have multiple files, create a batch folder
+    # Logic: If > 1 file, create batch. If 1 file, move to Waiting/Misc?
+    # Spec says "Groups bursts". We'll just batch everything for hygiene.
+    
+    batch_name = datetime.now().strftime("Batch_%Y-%m-%d_%H%M")
+    target_batch_dir = waiting_dir / batch_name
+    
+    if not target_batch_dir.exists():
+        target_batch_dir.mkdir(exist_ok=True)
+        
+    futures = []
+    for item in files:
+        future = mover.move(str(item), str(target_batch_dir))
+        future.add_done_callback(_log_failure(item, "batching"))
+        futures.append(future)
+    # Cross-device copies run in parallel; the count waits for them
+    moved_count = sum(1 for f in futures if f.exception() is None)
+            
+    if moved_count > 0:
+        notify.send(
+            "ZenOS Sorting Deck",
+            f"Moved {moved_count} unclassified items to {batch_name}",
+            urgency="low",
+            category="janitor.sorting", source="janitor", summary="{count} sorting batches"
+        )
 
+def run_once(config):
+    """One full pass over every watched dir (timer mode)."""
     grace_period = config.get('grace_period', 60)
     now = time.time()
+    ruleset = rule_engine.RuleSet(config.get('rules', {}))
+    mover = Mover()
+    sniffer = Sniffer()
     
     # Store unmatched files for batching: { parent_dir: [file_paths] }
     unmatched_files = {}
@@ -51,83 +119,199 @@ def main():
         
         unmatched_files[watch_dir] = []
 
-        # Iterate files in watched directory
-        for item in watch_dir.iterdir():
-            if not item.is_file() or item.name.startswith('.'):
-                continue
+        # Collect eligible files of the watched directory, then classify them in one batch
+        eligible = []
+        with os.scandir(watch_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
 
-            # [ SPEC 2.2 ] Check Grace Period
-            mtime = item.stat().st_mtime
-            if (now - mtime) < grace_period:
-                continue
+                # [ SPEC 2.2 ] Check Grace Period
+                if (now - entry.stat().st_mtime) < grace_period:
+                    continue
+                eligible.append(entry)
 
-            # Determine destination
-            dest_key = get_destination(item.suffix, config['rules'])
-            
-            if dest_key:
-                # [ LOGIC ] Matched Rule -> Move to Gate
-                user_root = watch_dir.parent
-                target_dir = user_root / dest_key
-                
-                if not target_dir.exists():
-                    try:
-                        target_dir.mkdir(parents=True, exist_ok=True)
-                    except PermissionError:
-                        continue
-
-                target_file = target_dir / item.name
-                if target_file.exists():
-                    stem = item.stem
-                    suffix = item.suffix
-                    counter = 1
-                    while target_file.exists():
-                        target_file = target_dir / f"{stem}_{counter}{suffix}"
-                        counter += 1
+        classified = ruleset.classify_batch(eligible, now)
+        # No suffix rule matched: look at the content before giving up on a file
+        unknown = [(entry.path, entry.stat()) for entry, dest_key in classified if not dest_key]
+        sniffed = iter(sniffer.classify_batch(unknown, ruleset, now))
 
-                try:
-                    print(f"[Dumb Janitor] Moving {item.name} -> {dest_key}")
-                    shutil.move(str(item), str(target_file))
-                except Exception as e:
-                    print(f"Error moving {item.name}: {e}")
+        for entry, dest_key in classified:
+            if not dest_key:
+                dest_key = next(sniffed)
+            if dest_key:
+                move_to_gate(Path(entry.path), watch_dir, dest_key, mover)
             else:
                 # No rule matched -> Add to potential batch
-                unmatched_files[watch_dir].append(item)
+                unmatched_files[watch_dir].append(Path(entry.path))
 
-    # [ SPEC 2.2 ] The Cluster Protocol
-    # Group unmatched files into bursts
     for parent, files in unmatched_files.items():
-        if not files:
-            continue
-            
-        # Create Waiting Gate
-        waiting_dir = parent / "Waiting"
-        if not waiting_dir.exists():
-            waiting_dir.mkdir(exist_ok=True)
-            
-        # Simple Clustering: If we have multiple files, create a batch folder
-        # Logic: If > 1 file, create batch. If 1 file, move to Waiting/Misc?
-        # Spec says "Groups bursts". We'll just batch everything for hygiene.
-        
-        batch_name = datetime.now().strftime("Batch_%Y-%m-%d_%H%M")
-        target_batch_dir = waiting_dir / batch_name
-        
-        if not target_batch_dir.exists():
-            target_batch_dir.mkdir(exist_ok=True)
-            
-        moved_count = 0
-        for item in files:
-            try:
-                shutil.move(str(item), str(target_batch_dir / item.name))
-                moved_count += 1
-            except Exception as e:
-                print(f"Error batching {item.name}: {e}")
-                
-        if moved_count > 0:
-            notify.send(
-                "ZenOS Sorting Deck",
-                f"Moved {moved_count} unclassified items to {batch_name}",
-                urgency="low"
-            )
+        batch_unmatched(parent, files, mover)
+    mover.shutdown()
+
+class GraceQueue:
+    """
+    Min-heap of files keyed by the moment they leave their grace period
+    (mtime + grace_period). A file touched again is simply pushed again;
+    the older heap entry is recognised as stale when it surfaces.
+    """
+    def __init__(self, grace_period):
+        self.grace_period = grace_period
+        self.heap = []
+        self.due = {}  # path -> current due time
+        self.cond = threading.Condition()
+
+    def push(self, path, mtime):
+        due = mtime + self.grace_period
+        with self.cond:
+            if self.due.get(path) == due:
+                return
+            self.due[path] = due
+            heapq.heappush(self.heap, (due, path))
+            # A file being written pushes on every event; drop the stale entries now and then
+            if len(self.heap) > 4 * len(self.due) + 64:
+                self.heap = [(d, p) for p, d in self.due.items()]
+                heapq.heapify(self.heap)
+            self.cond.notify()
+
+    def discard(self, path):
+        with self.cond:
+            self.due.pop(path, None)
+
+    def pop_due(self):
+        """Blocks until at least one file is due and returns all due paths."""
+        with self.cond:
+            while True:
+                now = time.time()
+                ready = []
+                while self.heap and self.heap[0][0] <= now:
+                    due, path = heapq.heappop(self.heap)
+                    if self.due.get(path) == due:
+                        del self.due[path]
+                        ready.append(path)
+                if ready:
+                    return ready
+                self.cond.wait(self.heap[0][0] - now if self.heap else None)
+
+class DumbHandler(FileSystemEventHandler):
+    def __init__(self, queue, watched):
+        self.queue = queue
+        self.watched = watched
+
+    def _track(self, path):
+        # Only direct children of a watched dir; our own Waiting/Batch moves are below it
+        if os.path.dirname(path) not in self.watched: return
+        if os.path.basename(path).startswith('.'): return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        if stat.S_ISREG(st.st_mode):
+            self.queue.push(path, st.st_mtime)
+
+    def on_created(self, event):
+        if not event.is_directory: self._track(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory: self._track(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory: return
+        self.queue.discard(event.src_path)
+        self._track(event.dest_path)
+
+    def on_deleted(self, event):
+        self.queue.discard(event.src_path)
+
+def run_daemon(config):
+    """
+    Event-driven mode: files are sorted the moment their grace period ends,
+    without periodic rescans. Watched dirs are listed once at startup.
+    """
+    grace_period = config.get('grace_period', 60)
+    ruleset = rule_engine.RuleSet(config.get('rules', {}))
+    queue = GraceQueue(grace_period)
+    mover = Mover()
+    sniffer = Sniffer()
+    watched = {}
+    for watch_dir_str in config.get('watched_dirs', []):
+        path = os.path.abspath(watch_dir_str)
+        if os.path.isdir(path):
+            watched[path] = Path(watch_dir_str)
+        else:
+            print(f"[Dumb Janitor] Skipping missing watched dir: {watch_dir_str}")
+
+    handler = DumbHandler(queue, watched)
+    observer = Observer()
+    for path in watched:
+        observer.schedule(handler, path, recursive=False)
+    observer.start()
+
+    # Backlog from while we were not running
+    for path in watched:
+        with os.scandir(path) as it:
+            for entry in it:
+                if not entry.name.startswith('.') and entry.is_file():
+                    queue.push(entry.path, entry.stat().st_mtime)
+    print(f"[Dumb Janitor] Watching {len(watched)} dirs (grace period {grace_period}s)")
+
+    try:
+        while True:
+            paths = queue.pop_due()
+            now = time.time()
+            unmatched_files = {}
+            eligible = []
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Moved or deleted meanwhile
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                # Touched without an event reaching us yet: wait out the new grace period
+                if (now - st.st_mtime) < grace_period:
+                    queue.push(path, st.st_mtime)
+                    continue
+                eligible.append((path, st, ruleset.classify(os.path.basename(path), lambda st=st: st, now)))
+
+            # Everything due together is sniffed together
+            unknown = [(path, st) for path, st, dest_key in eligible if not dest_key]
+            sniffed = iter(sniffer.classify_batch(unknown, ruleset, now))
+            for path, st, dest_key in eligible:
+                if not dest_key:
+                    dest_key = next(sniffed)
+                watch_dir = watched[os.path.dirname(path)]
+                if dest_key:
+                    move_to_gate(Path(path), watch_dir, dest_key, mover)
+                else:
+                    unmatched_files.setdefault(watch_dir, []).append(Path(path))
+            for parent, files in unmatched_files.items():
+                batch_unmatched(parent, files, mover)
+    except KeyboardInterrupt:
+        observer.stop()
+    mover.shutdown()
+    observer.join()
+
+def main():
+    global CONFIG_PATH
+    parser = argparse.ArgumentParser(description="ZenFS Dumb Janitor")
+    parser.add_argument("--config", help="Janitor JSON config (default: $JANITOR_CONFIG)")
+    parser.add_argument("--daemon", action="store_true", help="Watch the dirs and sort files as their grace period ends")
+    args = parser.parse_args()
+    if args.config:
+        CONFIG_PATH = args.config
+
+    try:
+        config = load_config()
+    except Exception as e:
+        print(f"Janitor Config Error: {e}")
+        return
+
+    if args.daemon:
+        sys.stdout.reconfigure(line_buffering=True)
+        run_daemon(config)
+    else:
+        run_once(config)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
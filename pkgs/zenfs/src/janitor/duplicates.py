@@ -0,0 +1,261 @@
+######
+# scripts/janitor/duplicates.py
+######
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Import shared notify module
+sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
+import notify
+from dedup import partial_hash, full_hash, PARTIAL_BLOCK
+from blockdev import human_size
+from suggestions import SuggestionStore
+
+# Exact duplicates across the scan dirs, in stages that each only touch what
+# the previous one left: size buckets (stat only) -> head/tail hash -> full
+# streaming hash. Hashes are cached by inode so unchanged files are not read
+# again on the next run.
+
+# [ CONFIG ]
+CONFIG_PATH = os.environ.get("JANITOR_CONFIG")
+MIN_SIZE = 1024 * 1024           # Smaller files are not worth a suggestion
+HASH_WORKERS = 4
+CACHE_RETENTION = 30 * 86400     # Cached hashes not used for this long are dropped
+
+def load_config():
+    if not CONFIG_PATH or not os.path.exists(CONFIG_PATH):
+        raise FileNotFoundError("JANITOR_CONFIG not set or file missing")
+    with open(CONFIG_PATH, 'r') as f:
+        return json.load(f)['duplicates']
+
+class HashCache:
+    """
+    Partial and full hashes keyed by (device, inode), valid while mtime and
+    size match. A changed file loses both.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " dev INTEGER, ino INTEGER, mtime INTEGER, size INTEGER,"
+            " partial TEXT, full TEXT, used_at REAL, PRIMARY KEY (dev, ino))"
+        )
+
+    def get(self, st, column):
+        row = self.db.execute(
+            f"SELECT mtime, size, {column} FROM hashes WHERE dev = ? AND ino = ?", (st.st_dev, st.st_ino)
+        ).fetchone()
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size and row[2]:
+            self.db.execute(
+                "UPDATE hashes SET used_at = ? WHERE dev = ? AND ino = ?", (time.time(), st.st_dev, st.st_ino)
+            )
+            return row[2]
+        return None
+
+    def put(self, st, column, value):
+        key = (st.st_dev, st.st_ino)
+        row = self.db.execute("SELECT mtime, size FROM hashes WHERE dev = ? AND ino = ?", key).fetchone()
+        if row and row == (st.st_mtime_ns, st.st_size):
+            self.db.execute(
+                f"UPDATE hashes SET {column} = ?, used_at = ? WHERE dev = ? AND ino = ?", (value, time.time()) + key
+            )
+        else:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO hashes (dev, ino, mtime, size, {column}, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                key + (st.st_mtime_ns, st.st_size, value, time.time())
+            )
+
+    def prune(self, retention=CACHE_RETENTION):
+        cur = self.db.execute("DELETE FROM hashes WHERE used_at < ?", (time.time() - retention,))
+        return cur.rowcount
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def size_buckets(roots, min_size=MIN_SIZE):
+    """
+    {size: [(path, stat)]} for regular files under roots, only sizes seen more
+    than once. Hard links of a file already seen are skipped: they are the
+    same data, not a copy of it.
+    """
+    by_size = {}
+    inodes = set()
+    stack = [str(r) for r in roots]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'): continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if st.st_size < min_size or (st.st_dev, st.st_ino) in inodes:
+                continue
+            inodes.add((st.st_dev, st.st_ino))
+            by_size.setdefault(st.st_size, []).append((entry.path, st))
+    return {size: files for size, files in by_size.items() if len(files) > 1}
+
+def _hash_file(func, path):
+    try:
+        return func(path)
+    except OSError:
+        return None
+
+def hash_stage(groups, cache, column, func, pool):
+    """
+    Splits each group of [(path, stat)] by a hash (cached, else computed in
+    the pool). Returns the new groups that still have more than one member.
+    """
+    hashes = {}
+    todo = []
+    for files in groups:
+        for path, st in files:
+            cached = cache.get(st, column)
+            if cached:
+                hashes[path] = cached
+            else:
+                todo.append((path, st))
+
+    results = pool.map(lambda item: _hash_file(func, item[0]), todo)
+    for (path, st), value in zip(todo, results):
+        if value is None:
+            continue  # Vanished or unreadable: not part of this run
+        hashes[path] = value
+        cache.put(st, column, value)
+
+    split = []
+    for files in groups:
+        by_hash = {}
+        for path, st in files:
+            if path in hashes:
+                by_hash.setdefault(hashes[path], []).append((path, st))
+        split.extend(g for g in by_hash.values() if len(g) > 1)
+    return split
+
+def find_duplicates(roots, cache, min_size=MIN_SIZE, workers=HASH_WORKERS):
+    """Lists of [(path, stat)] with identical content, each at least two files."""
+    buckets = size_buckets(roots, min_size)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        groups = hash_stage(buckets.values(), cache, "partial", partial_hash, pool)
+        # A file no larger than the head block was hashed whole already
+        small = [g for g in groups if g[0][1].st_size <= PARTIAL_BLOCK]
+        large = [g for g in groups if g[0][1].st_size > PARTIAL_BLOCK]
+        return small + hash_stage(large, cache, "full", full_hash, pool)
+
+def hashes_agree(cache):
+    """
+    still_valid check for SuggestionStore.recheck_duplicates: where both files
+    still have a valid cached hash, they must be equal. Files without one
+    (changed since, or never hashed here, e.g. near-duplicates) pass.
+    """
+    def check(row, source_st, target_st):
+        for column in ("full", "partial"):
+            a, b = cache.get(source_st, column), cache.get(target_st, column)
+            if a and b:
+                return a == b
+        return True
+    return check
+
+def pick_original(group):
+    """The copy to keep: oldest first, then the shortest path."""
+    return min(group, key=lambda f: (f[1].st_mtime_ns, len(f[0]), f[0]))
+
+def run_once(config):
+    roots = [d for d in config.get('scan_dirs', []) if os.path.isdir(d)]
+    if not roots:
+        print("[Duplicates] No scan dirs found.")
+        return
+    if not config.get('suggestions_db'):
+        print("[Duplicates] No suggestions_db configured.")
+        return
+
+    suggestions_db = Path(config['suggestions_db'])
+    cache = HashCache(config.get('cache_db') or suggestions_db.parent / "duplicates_hashes.db")
+    store = SuggestionStore(suggestions_db)
+
+    start = time.time()
+    # A suggestion whose copy to keep was deleted or changed would now point at the only copy
+    stale = store.recheck_duplicates(hashes_agree(cache))
+    if stale:
+        print(f"[Duplicates] {stale} pending suggestions no longer hold, marked stale.")
+    groups = find_duplicates(
+        roots, cache, config.get('min_size', MIN_SIZE), config.get('workers', HASH_WORKERS)
+    )
+    new_count = 0
+    reclaimable = 0
+    for group in groups:
+        original_path, _ = pick_original(group)
+        for path, st in group:
+            if path == original_path:
+                continue
+            reclaimable += st.st_size
+            added = store.add({
+                "source": path,
+                "suggested_target": original_path,
+                "reason": f"Identical to {os.path.basename(original_path)}",
+                "confidence": 1.0,
+                "timestamp": time.time(),
+                "status": "pending",
+                "action": "duplicate"
+            })
+            if added:
+                print(f"[Duplicates] Suggestion: Duplicate {os.path.basename(path)} -> {original_path}")
+                new_count += 1
+
+    # Suggestions first: cached hashes are only useful if the results they led to were kept
+    store.commit()
+    cache.prune()
+    cache.commit()
+    store.close()
+    cache.close()
+    print(f"[Duplicates] {len(groups)} groups, {human_size(reclaimable)} reclaimable ({time.time() - start:.1f}s)")
+
+    if new_count > 0:
+        notify.send(
+            "ZenOS Janitor",
+            f"Found {new_count} duplicate files ({human_size(reclaimable)} reclaimable).",
+            urgency="low",
+            icon="dialog-information",
+            category="janitor.duplicates", source="janitor"
+        )
+
+def main():
+    global CONFIG_PATH
+    parser = argparse.ArgumentParser(description="ZenFS Duplicate Finder")
+    parser.add_argument("--config", help="Janitor JSON config (default: $JANITOR_CONFIG)")
+    args = parser.parse_args()
+    if args.config:
+        CONFIG_PATH = args.config
+
+    try:
+        config = load_config()
+    except Exception as e:
+        print(f"Janitor Config Error: {e}")
+        return
+    run_once(config)
+
+if __name__ == "__main__":
+    main()
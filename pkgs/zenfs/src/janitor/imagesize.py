@@ -0,0 +1,110 @@
+######
+# scripts/janitor/imagesize.py
+######
+import os
+import struct
+
+# Image dimensions straight from the file header: PNG IHDR, GIF screen
+# descriptor, WebP VP8/VP8L/VP8X and JPEG SOF. Pillow is only imported for
+# formats (or files) the parser does not understand.
+
+# [ CONSTANTS ]
+HEAD_BYTES = 32
+JPEG_MAX_SCAN = 4 * 1024 * 1024  # Give up looking for SOF past this offset
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_pillow = None
+
+def _png(head, f):
+    if head[12:16] != b"IHDR": return None
+    return struct.unpack(">II", head[16:24])
+
+def _gif(head, f):
+    return struct.unpack("<HH", head[6:10])
+
+def _webp(head, f):
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        data = head[20:30]
+        if len(data) < 10 or data[3:6] != b"\x9d\x01\x2a": return None
+        w, h = struct.unpack("<HH", data[6:10])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L":
+        if head[20:21] != b"\x2f": return None
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        w = int.from_bytes(head[24:27], "little") + 1
+        h = int.from_bytes(head[27:30], "little") + 1
+        return w, h
+    return None
+
+def _jpeg(head, f):
+    """Walks the marker segments from SOI to the first SOF; skips over EXIF and friends with seeks."""
+    f.seek(2)
+    while f.tell() < JPEG_MAX_SCAN:
+        byte = f.read(1)
+        if not byte: return None
+        if byte != b"\xff": continue  # Tolerate garbage between segments
+        marker = f.read(1)
+        while marker == b"\xff":  # Fill bytes
+            marker = f.read(1)
+        if not marker: return None
+        code = marker[0]
+        if code == 0xD8 or code == 0x01 or 0xD0 <= code <= 0xD7:
+            continue  # No length field
+        if code == 0xD9 or code == 0xDA:
+            return None  # End of image / start of scan before any frame header
+        raw = f.read(2)
+        if len(raw) < 2: return None
+        length = struct.unpack(">H", raw)[0]
+        if code in JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5: return None
+            h, w = struct.unpack(">HH", data[1:5])
+            return w, h
+        f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+def _parser(head):
+    if head.startswith(b"\x89PNG\r\n\x1a\n"): return _png
+    if head[:6] in (b"GIF87a", b"GIF89a"): return _gif
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP": return _webp
+    if head[:3] == b"\xff\xd8\xff": return _jpeg
+    return None
+
+def read_dimensions(path):
+    """(width, height) from the header alone, or None if the format is unknown or the header broken."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(HEAD_BYTES)
+            parser = _parser(head)
+            if parser is None: return None
+            size = parser(head, f)
+    except (OSError, struct.error):
+        return None
+    if size and size[0] > 0 and size[1] > 0:
+        return size
+    return None
+
+def pillow_dimensions(path):
+    """img.size through Pillow, imported on first use. None if Pillow is missing or cannot open the file."""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image
+            _pillow = Image
+        except ImportError:
+            _pillow = False
+    if not _pillow:
+        return None
+    try:
+        with _pillow.open(path) as img:
+            return img.size
+    except Exception:
+        return None
+
+def dimensions(path):
+    """(width, height) of an image: header parser first, Pillow as the fallback."""
+    return read_dimensions(path) or pillow_dimensions(path)
@@ -0,0 +1,85 @@
+######
+# scripts/janitor/manifest.py
+######
+import os
+import json
+import time
+import sqlite3
+
+# [ CONSTANTS ]
+FULL_RESCAN_INTERVAL = 7 * 86400  # Ignore directory pruning now and then, to catch in-place edits
+
+class ScanManifest:
+    """
+    What the Oracle already looked at. Files are keyed by (device, inode) and
+    valid while mtime and size match; the stored result may be None (nothing
+    to suggest). Directories remember their mtime and subdirectories, so one
+    whose entries have not changed is not listed again.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " dev INTEGER, ino INTEGER, mtime INTEGER, size INTEGER, path TEXT,"
+            " result TEXT, analyzed_at REAL, PRIMARY KEY (dev, ino))"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER, subdirs TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'full_scan_at'").fetchone()
+        self.last_full = float(row[0]) if row else 0.0
+        self.full = time.time() - self.last_full > FULL_RESCAN_INTERVAL
+        self.seen = set()  # (dev, ino) met during a full run; the rest is dropped at commit
+
+    def lookup(self, st):
+        """(True, result) if this exact file version was analyzed before, else (False, None)."""
+        row = self.db.execute(
+            "SELECT mtime, size, result FROM files WHERE dev = ? AND ino = ?", (st.st_dev, st.st_ino)
+        ).fetchone()
+        if self.full:
+            self.seen.add((st.st_dev, st.st_ino))
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return True, json.loads(row[2]) if row[2] else None
+        return False, None
+
+    def record(self, path, st, result):
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (dev, ino, mtime, size, path, result, analyzed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size, str(path),
+             json.dumps(result) if result else None, time.time())
+        )
+
+    def unchanged_dir(self, path, mtime_ns):
+        """Subdirectories of path if its entries are unchanged since the last scan, else None."""
+        if self.full:
+            return None
+        row = self.db.execute("SELECT mtime, subdirs FROM dirs WHERE path = ?", (str(path),)).fetchone()
+        if row and row[0] == mtime_ns:
+            return json.loads(row[1])
+        return None
+
+    def record_dir(self, path, mtime_ns, subdirs):
+        self.db.execute(
+            "INSERT OR REPLACE INTO dirs (path, mtime, subdirs) VALUES (?, ?, ?)",
+            (str(path), mtime_ns, json.dumps(subdirs))
+        )
+
+    def forget_dir(self, path):
+        self.db.execute("DELETE FROM dirs WHERE path = ?", (str(path),))
+
+    def commit(self):
+        """Ends a run. Call only after every file the run listed was recorded."""
+        if self.full:
+            stale = [key for key in self.db.execute("SELECT dev, ino FROM files") if key not in self.seen]
+            self.db.executemany("DELETE FROM files WHERE dev = ? AND ino = ?", stale)
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('full_scan_at', ?)", (str(time.time()),)
+            )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -6,67 +6,100 @@ import sys
 import json
 import time
 from pathlib import Path
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Import shared notify module
 sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
 import notify
+from suggestions import SuggestionStore
+from manifest import ScanManifest
+import imagesize
+import phash
 
 # [ CONFIG ]
 CONFIG_PATH = os.environ.get("JANITOR_CONFIG")
+IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.webp'}
+TEXT_EXTS = {'.txt', '.md', '.py', '.sh'}
+BATCH_SIZE = 32      # Files per analyzer task
+CPU_BUDGET = 0.5     # Share of the cores the analyzers may use
+WORKER_NICE = 10     # Analyzer processes yield to interactive work
+
+def _worker_init():
+    try:
+        os.nice(WORKER_NICE)
+    except OSError:
+        pass
+
+def _analyze_one(path, hash_images, hash_only=False):
+    """(analyzer result, perceptual hashes or None) for one file. hash_only skips the analyzers (backfill)."""
+    item = Path(path)
+    hashes = phash.compute(item) if hash_images and item.suffix.lower() in IMAGE_EXTS else None
+    return (None if hash_only else JanitorML.analyze(item)), hashes
+
+def _analyze_batch(jobs, hash_images):
+    """Process pool task: _analyze_one for a batch of (path, hash_only)."""
+    return [_analyze_one(p, hash_images, hash_only) for p, hash_only in jobs]
 
 class JanitorML:
     def __init__(self):
         self.config = self._load_config()
         self.suggestions_db_path = Path(self.config['suggestions_db'])
-        self.suggestions = self._load_suggestions()
+        self.suggestions = SuggestionStore(self.suggestions_db_path)
+        self.manifest = ScanManifest(
+            self.config.get('manifest_db') or self.suggestions_db_path.parent / "oracle_manifest.db"
+        )
+        self.near = self._near_duplicates_index()
+        if self.near is not None and not self.near.backfilled():
+            # Images analyzed before the index existed are only met again on a full pass
+            self.manifest.full = True
+        self.pending_dirs = {}  # dir -> [candidates not yet written, mtime, subdirs]
         self.new_suggestions_count = 0
 
+    def _near_duplicates_index(self):
+        """The perceptual hash index, or None if near-duplicate detection is off or cannot run."""
+        near = self.config.get('near_duplicates', {})
+        if not near.get('enabled', True):
+            return None
+        try:
+            import numpy, PIL
+        except ImportError as e:
+            print(f"[Oracle] Near-duplicate detection disabled: {e}")
+            return None
+        return phash.PerceptualIndex(near.get('db') or self.suggestions_db_path.parent / "oracle_phash.db")
+
     def _load_config(self):
         if not CONFIG_PATH or not os.path.exists(CONFIG_PATH):
             raise FileNotFoundError("JANITOR_CONFIG not set")
         with open(CONFIG_PATH, 'r') as f:
             return json.load(f)['ml']
 
-    def _load_suggestions(self):
-        if self.suggestions_db_path.exists():
-            try:
-                with open(self.suggestions_db_path, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return []
-        return []
-
-    def _save_suggestions(self):
-        if not self.suggestions_db_path.parent.exists():
-            self.suggestions_db_path.parent.mkdir(parents=True, exist_ok=True)
-            
-        with open(self.suggestions_db_path, 'w') as f:
-            json.dump(self.suggestions, f, indent=2)
-
-    def analyze_image(self, filepath):
-        try:
-            with Image.open(filepath) as img:
-                width, height = img.size
-                aspect = width / height if height else 0
-                
-                is_screenshot = False
-                if 1.77 <= aspect <= 1.78 or 0.56 <= aspect <= 0.57:
-                    is_screenshot = True
-                
-                parent_name = filepath.parent.name.lower()
-                if "camera" in parent_name and is_screenshot:
-                     return {
-                        "action": "move",
-                        "target": "Screenshots",
-                        "reason": "Detected 16:9 aspect ratio in Camera folder",
-                        "confidence": 0.85
-                    }
-        except Exception:
-            pass
+    @staticmethod
+    def analyze_image(filepath):
+        # Only Camera folders are of interest; no need to read anything elsewhere
+        parent_name = filepath.parent.name.lower()
+        if "camera" not in parent_name:
+            return None
+        size = imagesize.dimensions(filepath)
+        if not size:
+            return None
+        width, height = size
+        aspect = width / height if height else 0
+        
+        is_screenshot = False
+        if 1.77 <= aspect <= 1.78 or 0.56 <= aspect <= 0.57:
+            is_screenshot = True
+        
+        if is_screenshot:
+             return {
+                "action": "move",
+                "target": "Screenshots",
+                "reason": "Detected 16:9 aspect ratio in Camera folder",
+                "confidence": 0.85
+            }
         return None
 
-    def analyze_text(self, filepath):
+    @staticmethod
+    def analyze_text(filepath):
         try:
             with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
                 head = f.read(1024)
@@ -100,44 +133,219 @@ class JanitorML:
             "reason": analysis['reason'],
             "confidence": analysis['confidence'],
             "timestamp": time.time(),
-            "status": "pending"
+            "status": "pending",
+            "action": analysis.get('action', 'move')
         }
         
-        # Avoid duplicates
-        for s in self.suggestions:
-            if s['source'] == str(filepath) and s['status'] == 'pending':
-                return
+        # Avoid duplicates (the store keeps one pending suggestion per source)
+        if not self.suggestions.add(suggestion):
+            return
 
-        print(f"[Oracle] Suggestion: Move {filepath.name} -> {analysis['target']} ({analysis['reason']})")
-        self.suggestions.append(suggestion)
+        action = analysis.get('action', 'move').capitalize()
+        print(f"[Oracle] Suggestion: {action} {filepath.name} -> {analysis['target']} ({analysis['reason']})")
         self.new_suggestions_count += 1
 
+    def scan(self, root):
+        """
+        Yields (Path, stat, hash_only) for analyzable files under root that
+        changed since they were last analyzed. On a full pass, images the
+        manifest knows but the perceptual index does not are yielded with
+        hash_only set, so the existing library gets hashed too. Directories whose entries are unchanged are
+        not listed again; only their subdirectories are visited. A directory
+        with candidates is recorded by the writer once all of them are written
+        (see _settle), so a failed batch is listed again next run.
+        """
+        stack = [str(root)]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                self.manifest.forget_dir(dir_path)
+                continue
+
+            subdirs = self.manifest.unchanged_dir(dir_path, dir_mtime)
+            if subdirs is not None:
+                stack.extend(subdirs)
+                continue
+
+            subdirs = []
+            candidates = []
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext not in IMAGE_EXTS and ext not in TEXT_EXTS:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                seen, _ = self.manifest.lookup(st)
+                if not seen:
+                    candidates.append((Path(entry.path), st, False))
+                elif self.near is not None and ext in IMAGE_EXTS:
+                    if self.manifest.full and not self.near.has(st):
+                        candidates.append((Path(entry.path), st, True))
+                    else:
+                        # Moved by the janitor (same inode): keep its index row pointing at it
+                        self.near.relocate(entry.path, st)
+            if candidates:
+                self.pending_dirs[dir_path] = [len(candidates), dir_mtime, subdirs]
+                yield from candidates
+            else:
+                self.manifest.record_dir(dir_path, dir_mtime, subdirs)
+            stack.extend(subdirs)
+
+    @staticmethod
+    def analyze(item):
+        ext = item.suffix.lower()
+        if ext in IMAGE_EXTS:
+            return JanitorML.analyze_image(item)
+        if ext in TEXT_EXTS:
+            return JanitorML.analyze_text(item)
+        return None
+
+    def worker_count(self):
+        """Analyzer processes: the configured count, capped by the CPU budget."""
+        cpus = os.cpu_count() or 1
+        budget = max(1, int(cpus * self.config.get('cpu_budget', CPU_BUDGET)))
+        return max(1, min(self.config.get('workers') or cpus, budget))
+
+    def check_near_duplicate(self, item, st, hashes):
+        """Suggests item as a duplicate of the closest indexed look-alike, then indexes it."""
+        near = self.config.get('near_duplicates', {})
+        p, d = hashes
+        matches = self.near.near(
+            p, d, near.get('radius', phash.PHASH_RADIUS), near.get('dhash_radius', phash.DHASH_RADIUS),
+            exclude=st
+        )
+        if matches:
+            original, distance = matches[0]
+            self.add_suggestion(item, {
+                "action": "duplicate",
+                "target": original,
+                "reason": f"Near-duplicate of {os.path.basename(original)} ({distance} bits apart)",
+                "confidence": 0.95 if distance <= 2 else 0.8
+            })
+        self.near.add(item, st, p, d)
+
+    def _settle(self, item, ok):
+        """
+        One candidate of a directory is done. The directory is recorded as
+        unchanged once all of its candidates were written; if any failed it is
+        forgotten instead, so the next run lists it again.
+        """
+        dir_path = str(item.parent)
+        pending = self.pending_dirs.get(dir_path)
+        if pending is None:
+            return
+        if not ok:
+            del self.pending_dirs[dir_path]
+            self.manifest.forget_dir(dir_path)
+            return
+        pending[0] -= 1
+        if pending[0] == 0:
+            del self.pending_dirs[dir_path]
+            self.manifest.record_dir(dir_path, pending[1], pending[2])
+
+    def _write(self, batch, outputs):
+        """Writer stage: the only place the manifest, the suggestions and the hash index are written."""
+        for (item, st, hash_only), (result, hashes) in zip(batch, outputs):
+            if not hash_only:
+                self.manifest.record(item, st, result)
+            if hashes and self.near is not None:
+                self.check_near_duplicate(item, st, hashes)
+            if result:
+                self.add_suggestion(item, result)
+            self._settle(item, True)
+        return len(batch)
+
+    def analyze_all(self, candidates):
+        """
+        Pipeline: candidates (from the scanner) are cut into batches and analyzed
+        in a process pool; results come back here in completion order and are
+        written by this thread alone. In-flight batches are bounded, so the
+        scanner never runs far ahead. Returns the number of files analyzed.
+        """
+        workers = self.worker_count()
+        batch_size = self.config.get('batch_size', BATCH_SIZE)
+        hash_images = self.near is not None
+        done = 0
+        if workers == 1:
+            for item, st, hash_only in candidates:
+                done += self._write([(item, st, hash_only)], [_analyze_one(item, hash_images, hash_only)])
+            return done
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            in_flight = {}
+            def drain(block):
+                nonlocal done
+                if block:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                else:
+                    finished = [f for f in in_flight if f.done()]
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"[Oracle] Analyzer batch failed: {e}")
+                        # Not recorded, and their directories are forgotten: retried next run
+                        for item, _, _ in batch:
+                            self._settle(item, False)
+                        continue
+                    done += self._write(batch, results)
+
+            batch = []
+            for candidate in candidates:
+                batch.append(candidate)
+                if len(batch) < batch_size:
+                    continue
+                in_flight[pool.submit(_analyze_batch, [(str(item), hash_only) for item, _, hash_only in batch], hash_images)] = batch
+                batch = []
+                drain(block=len(in_flight) >= 2 * workers)
+            if batch:
+                in_flight[pool.submit(_analyze_batch, [(str(item), hash_only) for item, _, hash_only in batch], hash_images)] = batch
+            while in_flight:
+                drain(block=True)
+        return done
+
     def run(self):
         print("ZenOS Oracle: Beginning Scan...")
+        # Near-duplicates whose original was deleted or changed would now point at the only copy
+        stale = self.suggestions.recheck_duplicates()
+        if stale:
+            print(f"[Oracle] {stale} pending duplicate suggestions no longer hold, marked stale.")
         scan_dirs = self.config.get('scan_dirs', [])
+        analyzed = 0
         
         for dir_path in scan_dirs:
             path = Path(dir_path)
             if not path.exists():
                 continue
                 
-            for item in path.rglob('*'):
-                if item.is_file():
-                    if item.name.startswith('.'):
-                        continue
-                        
-                    ext = item.suffix.lower()
-                    result = None
-                    
-                    if ext in ['.png', '.jpg', '.jpeg', '.webp']:
-                        result = self.analyze_image(item)
-                    elif ext in ['.txt', '.md', '.py', '.sh']:
-                        result = self.analyze_text(item)
-                        
-                    if result:
-                        self.add_suggestion(item, result)
-
-        self._save_suggestions()
+            # Only new or changed files are opened; "no suggestion" is remembered too
+            analyzed += self.analyze_all(self.scan(path))
+
+        # Suggestions and hashes first: a file must not be marked analyzed if they were lost
+        self.suggestions.commit()
+        if self.near is not None:
+            if self.manifest.full:
+                self.near.prune(self.manifest.seen)
+                self.near.mark_backfilled()
+            self.near.commit()
+        self.manifest.commit()
+        self.suggestions.compact()
+        print(f"ZenOS Oracle: Analyzed {analyzed} new or changed files.")
         print("ZenOS Oracle: Scan Complete.")
         
         # [ NOTIFY ]
@@ -146,7 +354,8 @@ class JanitorML:
                 "ZenOS Oracle", 
                 f"I have {self.new_suggestions_count} new optimization suggestions.", 
                 urgency="low",
-                icon="dialog-information"
+                icon="dialog-information",
+                category="oracle.suggestions", source="oracle"
             )
 
 if __name__ == "__main__":
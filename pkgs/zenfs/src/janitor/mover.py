@@ -0,0 +1,164 @@
+######
+# scripts/janitor/mover.py
+######
+import os
+import time
+import errno
+import ctypes
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Fast-path file mover for the Dumb Janitor: same-filesystem moves are a single
+# no-replace rename, collision suffixes come from an in-memory name index, and
+# only cross-device moves are copied, on a worker pool.
+
+# [ CONSTANTS ]
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+COPY_WORKERS = 4
+INDEX_TTL = 300  # Seconds before a directory's name index is re-read
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_renameat2 = getattr(_libc, "renameat2", None)
+if _renameat2 is not None:
+    _renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+
+def rename_noreplace(src, dst):
+    """
+    Atomically renames src to dst, failing with FileExistsError if dst exists.
+    Raises OSError(EXDEV) across filesystems.
+    """
+    global _renameat2
+    if _renameat2 is not None:
+        if _renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), src, None, dst)
+        if err == errno.ENOSYS:
+            _renameat2 = None
+        # EINVAL: this filesystem has no RENAME_NOREPLACE, fall through
+    try:
+        # link() never replaces, so link + unlink is a no-replace move for files
+        os.link(src, dst, follow_symlinks=False)
+        os.unlink(src)
+        return
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            raise
+        # No hard links here (FAT, exFAT...): check, then rename
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+    os.rename(src, dst)
+
+class NameIndex:
+    """Names present in one directory, plus the next free counter per (stem, suffix)."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+        try:
+            self.device = os.stat(path).st_dev
+            with os.scandir(path) as it:
+                self.names = {entry.name for entry in it}
+        except FileNotFoundError:
+            self.device = None
+            self.names = set()
+        self.counters = {}
+
+    def reserve(self, name):
+        """
+        Returns a free name for this directory, name_N style like before,
+        and marks it taken.
+        """
+        with self.lock:
+            if name not in self.names:
+                self.names.add(name)
+                return name
+            stem, suffix = os.path.splitext(name)
+            if stem == "":  # A dotfile, splitext sees no suffix
+                stem, suffix = name, ""
+            counter = self.counters.get((stem, suffix), 1)
+            candidate = f"{stem}_{counter}{suffix}"
+            while candidate in self.names:
+                counter += 1
+                candidate = f"{stem}_{counter}{suffix}"
+            self.counters[(stem, suffix)] = counter + 1
+            self.names.add(candidate)
+            return candidate
+
+    def release(self, name):
+        with self.lock:
+            self.names.discard(name)
+
+class Mover:
+    """
+    move(src, target_dir) returns a Future resolving to the final path.
+    Same-filesystem moves complete before move() returns.
+    """
+    def __init__(self, workers=COPY_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="janitor-copy")
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index(self, target_dir):
+        with self.lock:
+            index = self.indexes.get(target_dir)
+            if index is None or time.monotonic() - index.loaded_at > INDEX_TTL:
+                index = self.indexes[target_dir] = NameIndex(target_dir)
+            return index
+
+    def _place(self, src, target_dir, name):
+        """No-replace rename of src into target_dir under a free name. Raises EXDEV across devices."""
+        index = self.index(target_dir)
+        while True:
+            final = index.reserve(name)
+            dst = os.path.join(target_dir, final)
+            try:
+                rename_noreplace(src, dst)
+                return dst
+            except FileExistsError:
+                continue  # Created behind our back; it stays marked taken
+            except OSError:
+                index.release(final)
+                raise
+
+    def _copy(self, src, target_dir, name):
+        # One staging name per worker, so copies of same-named files cannot collide
+        part = os.path.join(target_dir, f".{name}.{threading.get_ident()}.zenfs-part")
+        try:
+            if os.path.isdir(src):
+                shutil.copytree(src, part, symlinks=True)
+            else:
+                shutil.copy2(src, part)
+            dst = self._place(part, target_dir, name)
+        except BaseException:
+            if os.path.isdir(part): shutil.rmtree(part, ignore_errors=True)
+            elif os.path.lexists(part): os.unlink(part)
+            raise
+        if os.path.isdir(src) and not os.path.islink(src):
+            shutil.rmtree(src)
+        else:
+            os.unlink(src)
+        return dst
+
+    def move(self, src, target_dir, name=None):
+        name = name or os.path.basename(src)
+        try:
+            if os.lstat(src).st_dev != self.index(target_dir).device:
+                return self.pool.submit(self._copy, src, target_dir, name)
+            done = Future()
+            done.set_result(self._place(src, target_dir, name))
+            return done
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                done = Future()
+                done.set_exception(e)
+                return done
+        return self.pool.submit(self._copy, src, target_dir, name)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
@@ -201,7 +201,8 @@ def generate_forest(config):
             "ZenOS Conductor",
             f"Forest Regenerated ({count} files).",
             urgency="low",
-            icon="audio-x-generic"
+            icon="audio-x-generic",
+            category="conductor.forest", source="conductor", summary="Forest regenerated {count} times"
         )
 
 class MusicChangeHandler(FileSystemEventHandler):
@@ -0,0 +1,197 @@
+######
+# scripts/janitor/phash.py
+######
+import os
+import time
+import sqlite3
+
+# Perceptual hashes for near-duplicate images, and a persistent BK-tree over
+# them so "what is within Hamming distance r" does not compare against the
+# whole library. Pillow and NumPy are imported on first use.
+
+# [ CONSTANTS ]
+PHASH_RADIUS = 6    # pHash bits that may differ for a near-duplicate
+DHASH_RADIUS = 10   # Confirmation on the dHash, cuts false positives
+DCT_SIZE = 32
+_dct = None
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def _bits_to_int(np, bits):
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+def _dct_matrix(np):
+    global _dct
+    if _dct is None:
+        n = DCT_SIZE
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        m[0, :] = np.sqrt(1.0 / n)
+        _dct = m
+    return _dct
+
+def compute(path):
+    """(phash, dhash) as 64-bit ints, or None if the image cannot be decoded."""
+    import numpy as np
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            # Lets the JPEG decoder scale down while decoding instead of after
+            img.draft("L", (DCT_SIZE * 2, DCT_SIZE * 2))
+            gray = img.convert("L")
+            small = np.asarray(gray.resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+            tiny = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    except Exception:
+        return None
+
+    # pHash: low 8x8 frequencies of the 2D DCT against their median (DC excluded)
+    m = _dct_matrix(np)
+    low = (m @ small @ m.T)[:8, :8]
+    median = np.median(low.ravel()[1:])
+    phash = _bits_to_int(np, low > median)
+
+    # dHash: horizontal gradient signs
+    dhash = _bits_to_int(np, tiny[:, 1:] > tiny[:, :-1])
+    return phash, dhash
+
+class PerceptualIndex:
+    """
+    BK-tree over pHashes, stored in SQLite and held in memory while the
+    Oracle runs. A node per distinct hash; images point at their node and
+    are keyed by (device, inode) like the scan manifest, so a moved file
+    keeps its row and only its path is updated.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, hash INTEGER, parent INTEGER, dist INTEGER)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(images)")]
+        if columns and "ino" not in columns:
+            # Path-keyed rows from before; the backfill hashes those images again
+            self.db.execute("DROP TABLE images")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " dev INTEGER, ino INTEGER, path TEXT, node INTEGER, dhash INTEGER, added_at REAL,"
+            " PRIMARY KEY (dev, ino))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_by_node ON images(node)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        self.hashes = {}    # node id -> hash
+        self.children = {}  # node id -> {distance: child id}
+        self.root = None
+        # SQLite integers are signed 64-bit; hashes are stored shifted into range
+        for node, h, parent, dist in self.db.execute("SELECT id, hash, parent, dist FROM nodes ORDER BY id"):
+            self.hashes[node] = h + (1 << 63)
+            if parent is None:
+                self.root = node
+            else:
+                self.children.setdefault(parent, {})[dist] = node
+
+    def _node_for(self, h):
+        """Node holding exactly this hash, created if needed."""
+        if self.root is None:
+            self.root = self._new_node(h, None, None)
+            return self.root
+        node = self.root
+        while True:
+            d = hamming(h, self.hashes[node])
+            if d == 0:
+                return node
+            child = self.children.get(node, {}).get(d)
+            if child is None:
+                return self._new_node(h, node, d)
+            node = child
+
+    def _new_node(self, h, parent, dist):
+        cur = self.db.execute(
+            "INSERT INTO nodes (hash, parent, dist) VALUES (?, ?, ?)", (h - (1 << 63), parent, dist)
+        )
+        node = cur.lastrowid
+        self.hashes[node] = h
+        if parent is not None:
+            self.children.setdefault(parent, {})[dist] = node
+        return node
+
+    def query(self, h, radius):
+        """[(node, distance)] within radius; only subtrees the triangle inequality allows are visited."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, self.hashes[node])
+            if d <= radius:
+                found.append((node, d))
+            for dist, child in self.children.get(node, {}).items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+    def near(self, phash, dhash, radius=PHASH_RADIUS, dhash_radius=DHASH_RADIUS, exclude=None):
+        """
+        [(path, phash distance)] of indexed images that look like this one,
+        closest first. exclude is a stat result (the image itself). Rows whose
+        path is gone are skipped but kept: the file may have moved, and the
+        scan updates the path when it meets the inode again.
+        """
+        skip = (exclude.st_dev, exclude.st_ino) if exclude is not None else None
+        matches = []
+        for node, d in self.query(phash, radius):
+            rows = self.db.execute("SELECT dev, ino, path, dhash FROM images WHERE node = ?", (node,))
+            for dev, ino, path, other_dhash in rows:
+                if (dev, ino) == skip:
+                    continue
+                if hamming(dhash, other_dhash + (1 << 63)) > dhash_radius:
+                    continue
+                if not os.path.exists(path):
+                    continue
+                matches.append((path, d))
+        matches.sort(key=lambda m: m[1])
+        return matches
+
+    def has(self, st):
+        return self.db.execute(
+            "SELECT 1 FROM images WHERE dev = ? AND ino = ?", (st.st_dev, st.st_ino)
+        ).fetchone() is not None
+
+    def relocate(self, path, st):
+        """Points the row of this inode at path, if it is indexed under another one."""
+        self.db.execute(
+            "UPDATE images SET path = ? WHERE dev = ? AND ino = ? AND path != ?",
+            (str(path), st.st_dev, st.st_ino, str(path))
+        )
+
+    def add(self, path, st, phash, dhash):
+        node = self._node_for(phash)
+        self.db.execute(
+            "INSERT OR REPLACE INTO images (dev, ino, path, node, dhash, added_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (st.st_dev, st.st_ino, str(path), node, dhash - (1 << 63), time.time())
+        )
+
+    def prune(self, keep):
+        """Drops images whose (dev, ino) is not in keep. Returns rows removed."""
+        stale = [key for key in self.db.execute("SELECT dev, ino FROM images") if key not in keep]
+        self.db.executemany("DELETE FROM images WHERE dev = ? AND ino = ?", stale)
+        return len(stale)
+
+    def backfilled(self):
+        """True once a full pass has hashed the library that existed before the index."""
+        return self.db.execute("SELECT 1 FROM meta WHERE key = 'backfilled_at'").fetchone() is not None
+
+    def mark_backfilled(self):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled_at', ?)", (str(time.time()),))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,148 @@
+######
+# scripts/janitor/rules.py
+######
+import os
+import re
+import time
+import fnmatch
+
+# Compiled sorting rules for the Dumb Janitor.
+#
+# The "rules" config maps a destination folder to either a list of extensions
+# (the classic form) or one or more rule objects:
+#
+#   "Pictures": ["png", "jpg"],
+#   "Installers": {"extensions": ["iso"], "min_size": "100M"},
+#   "Screenshots": [{"glob": "Screenshot*.png"}, {"regex": "^scr_\\d+"}],
+#   "Stale": {"min_age": 2592000}
+#
+# Rules are tried in config order; the first match wins, as before.
+
+# [ CONSTANTS ]
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(value):
+    if value is None or isinstance(value, (int, float)): return value
+    value = str(value).strip().upper().rstrip("B")
+    if value and value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+def normalize_ext(extension):
+    return extension.lower().strip('.')
+
+def split_ext(name):
+    """Extension as get_destination sees it: Path.suffix without the dot, lowercased."""
+    root, ext = os.path.splitext(name)
+    return normalize_ext(ext)
+
+class Rule:
+    __slots__ = ("order", "folder", "extensions", "name_re", "min_size", "max_size", "min_age", "max_age",
+                 "needs_stat", "is_plain")
+
+    def __init__(self, order, folder, spec):
+        self.order = order
+        self.folder = folder
+        if isinstance(spec, (list, tuple)):
+            spec = {"extensions": spec}
+        # None: any extension. An empty list (classic form) matches nothing, as before.
+        self.extensions = {normalize_ext(e) for e in spec["extensions"]} if "extensions" in spec else None
+
+        patterns = []
+        globs = spec.get("glob", [])
+        for pattern in [globs] if isinstance(globs, str) else globs:
+            patterns.append(fnmatch.translate(pattern))
+        regexes = spec.get("regex", [])
+        for pattern in [regexes] if isinstance(regexes, str) else regexes:
+            patterns.append(f"(?:{pattern})")
+        # One alternation per rule: a single regex call per candidate name
+        self.name_re = re.compile("|".join(patterns)) if patterns else None
+
+        self.min_size = parse_size(spec.get("min_size"))
+        self.max_size = parse_size(spec.get("max_size"))
+        self.min_age = spec.get("min_age")
+        self.max_age = spec.get("max_age")
+        self.needs_stat = any(v is not None for v in (self.min_size, self.max_size, self.min_age, self.max_age))
+        self.is_plain = self.name_re is None and not self.needs_stat
+
+    def matches(self, name, stat_func, now):
+        if self.name_re is not None and not self.name_re.match(name):
+            return False
+        if not self.needs_stat:
+            return True
+        st = stat_func()
+        if st is None:
+            return False
+        if self.min_size is not None and st.st_size < self.min_size: return False
+        if self.max_size is not None and st.st_size > self.max_size: return False
+        age = now - st.st_mtime
+        if self.min_age is not None and age < self.min_age: return False
+        if self.max_age is not None and age > self.max_age: return False
+        return True
+
+class RuleSet:
+    """
+    Rules compiled once from the config. Extension-keyed rules live in a hash
+    index; rules without extensions are checked in order alongside them.
+    """
+    def __init__(self, rules):
+        self.rules = []
+        for folder, specs in rules.items():
+            if isinstance(specs, dict) or (specs and all(isinstance(s, dict) for s in specs)):
+                specs = [specs] if isinstance(specs, dict) else specs
+                for spec in specs:
+                    self.rules.append(Rule(len(self.rules), folder, spec))
+            else:
+                self.rules.append(Rule(len(self.rules), folder, specs or []))
+
+        self.by_ext = {}
+        self.generic = []
+        for rule in self.rules:
+            if rule.extensions is None:
+                self.generic.append(rule)
+            else:
+                for ext in rule.extensions:
+                    self.by_ext.setdefault(ext, []).append(rule)
+        # Per indexed extension: its own rules merged with the generic ones, in config order.
+        # Any other extension only sees the generic chain.
+        self.chains = {ext: self._merge(ext_rules) for ext, ext_rules in self.by_ext.items()}
+        self.generic_chain = self._merge([])
+
+    def _merge(self, ext_rules):
+        chain = sorted(ext_rules + self.generic, key=lambda r: r.order)
+        # Nothing after an unconditional rule can win
+        for i, rule in enumerate(chain):
+            if rule.is_plain:
+                return chain[:i + 1]
+        return chain
+
+    def classify(self, name, stat_func=None, now=None):
+        """Destination folder for a file name, or None. stat_func is only called if a rule needs it."""
+        chain = self.chains.get(split_ext(name), self.generic_chain)
+        if not chain:
+            return None
+        if chain[0].is_plain:
+            return chain[0].folder  # The classic extension-only case
+        now = time.time() if now is None else now
+        cached = []
+        def stat_once():
+            if not cached:
+                try:
+                    cached.append(stat_func() if stat_func else None)
+                except OSError:
+                    cached.append(None)
+            return cached[0]
+        for rule in chain:
+            if rule.matches(name, stat_once, now):
+                return rule.folder
+        return None
+
+    def classify_batch(self, entries, now=None):
+        """
+        Classifies a directory listing in one call.
+        entries: os.DirEntry objects (their cached stat is reused).
+        Returns [(entry, folder or None)].
+        """
+        now = time.time() if now is None else now
+        classify = self.classify
+        return [(entry, classify(entry.name, entry.stat, now)) for entry in entries]
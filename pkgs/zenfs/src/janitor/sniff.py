@@ -0,0 +1,152 @@
+######
+# scripts/janitor/sniff.py
+######
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rules import split_ext
+
+# Content sniffing for files without a suffix, or with one the rules do not
+# know: one pread of the header, matched against magic bytes, gives the
+# extension the file should have had. The rules are then applied as if it
+# had it.
+
+# [ CONSTANTS ]
+HEADER_BYTES = 512  # Enough for the tar magic at offset 257
+SNIFF_WORKERS = 8
+CACHE_ENTRIES = 65536
+
+# (offset, magic, extension), first match wins
+SIGNATURES = [
+    (0, b"%PDF-", "pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"PK\x03\x04", "zip"),
+    (0, b"\x1f\x8b", "gz"),
+    (0, b"\xfd7zXZ\x00", "xz"),
+    (0, b"(\xb5/\xfd", "zst"),
+    (0, b"BZh", "bz2"),
+    (0, b"7z\xbc\xaf\x27\x1c", "7z"),
+    (0, b"Rar!\x1a\x07", "rar"),
+    (0, b"!<arch>\ndebian", "deb"),
+    (0, b"\xed\xab\xee\xdb", "rpm"),
+    (0, b"\x7fELF", "elf"),
+    (0, b"SQLite format 3\x00", "sqlite"),
+    (0, b"ID3", "mp3"),
+    (0, b"fLaC", "flac"),
+    (0, b"OggS", "ogg"),
+    (0, b"\x1aE\xdf\xa3", "mkv"),
+    (0, b"%!PS", "ps"),
+    (0, b"{\\rtf", "rtf"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "doc"),
+    (257, b"ustar", "tar"),
+]
+
+# RIFF containers carry their type at offset 8
+RIFF_TYPES = {b"WEBP": "webp", b"WAVE": "wav", b"AVI ": "avi"}
+
+# ISO base media (MP4 family): "ftyp" at offset 4, brand after it
+FTYP_BRANDS = {b"qt  ": "mov", b"M4A ": "m4a", b"heic": "heic", b"heix": "heic", b"avif": "avif"}
+
+# Generic containers: .docx/.epub/.jar/.apk are ZIPs, .xls/.msi are OLE, ...
+# A file that already has a suffix is never re-filed as one of these.
+CONTAINER_TYPES = {"zip", "doc", "mp4", "mkv", "ogg", "sqlite"}
+
+def sniff_header(header):
+    """Extension for a file header, or None."""
+    if header[:4] == b"RIFF" and len(header) >= 12:
+        return RIFF_TYPES.get(header[8:12])
+    if header[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(header[8:12], "mp4")
+    for offset, magic, ext in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return ext
+    return None
+
+def read_header(path, size=HEADER_BYTES):
+    """First size bytes of a file with a single pread, or None if it cannot be read."""
+    flags = os.O_RDONLY | os.O_NOFOLLOW
+    try:
+        # Sniffing should not make the file look recently used (O_NOATIME needs ownership)
+        try:
+            fd = os.open(path, flags | getattr(os, "O_NOATIME", 0))
+        except PermissionError:
+            fd = os.open(path, flags)
+    except OSError:
+        return None
+    try:
+        return os.pread(fd, size, 0)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+class Sniffer:
+    """
+    Sniffs batches of files in parallel. Results are cached by
+    (device, inode, mtime, size), so a file that is seen again unchanged
+    (the daemon re-checking it, a second pass) is not read again.
+    """
+    def __init__(self, workers=SNIFF_WORKERS):
+        self.workers = max(1, workers)
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(st):
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def sniff_batch(self, items):
+        """
+        items: [(path, stat_result)]. Returns the sniffed extension (or None) per item.
+        """
+        results = [None] * len(items)
+        todo = []
+        with self.lock:
+            for i, (path, st) in enumerate(items):
+                key = self._key(st)
+                if key in self.cache:
+                    results[i] = self.cache[key]
+                elif st.st_size > 0:
+                    todo.append(i)
+        if not todo:
+            return results
+
+        paths = [items[i][0] for i in todo]
+        if len(paths) == 1:
+            headers = [read_header(paths[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+                headers = list(pool.map(read_header, paths))
+
+        with self.lock:
+            for i, header in zip(todo, headers):
+                if header is None:
+                    continue  # Unreadable right now: try again next time
+                ext = sniff_header(header)
+                results[i] = ext
+                self.cache[self._key(items[i][1])] = ext
+            # Oldest entries go first
+            while len(self.cache) > CACHE_ENTRIES:
+                del self.cache[next(iter(self.cache))]
+        return results
+
+    def classify_batch(self, items, ruleset, now=None):
+        """
+        Rule folder per item, applying the rules as if each file carried its
+        sniffed extension. Only files with no suffix, or one no rule lists,
+        are read. Returns [folder or None].
+        """
+        suffixes = [split_ext(path) for path, _ in items]
+        todo = [i for i, suffix in enumerate(suffixes) if not suffix or suffix not in ruleset.by_ext]
+        folders = [None] * len(items)
+        for i, ext in zip(todo, self.sniff_batch([items[i] for i in todo])):
+            if ext is None or (suffixes[i] and ext in CONTAINER_TYPES):
+                continue
+            path, st = items[i]
+            name = f"{os.path.basename(path)}.{ext}"
+            folders[i] = ruleset.classify(name, lambda st=st: st, now)
+        return folders
@@ -0,0 +1,153 @@
+######
+# scripts/janitor/suggestions.py
+######
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# [ CONSTANTS ]
+RESOLVED_RETENTION = 90 * 86400  # Accepted/rejected/stale suggestions are kept this long
+FIELDS = ("source", "suggested_target", "reason", "confidence", "timestamp", "status", "action")
+
+class SuggestionStore:
+    """
+    The Oracle's suggestions, in SQLite at the configured suggestions_db path.
+    At most one pending suggestion per source; lookups by (source, status)
+    and by status go through indexes. A legacy JSON list at the same path is
+    imported on first open.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        legacy = self._read_legacy()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS suggestions ("
+            " id INTEGER PRIMARY KEY, source TEXT NOT NULL, suggested_target TEXT,"
+            " reason TEXT, confidence REAL, timestamp REAL, status TEXT NOT NULL,"
+            " action TEXT NOT NULL DEFAULT 'move')"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS by_source_status ON suggestions(source, status)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS by_status ON suggestions(status, timestamp)")
+        self.db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS one_pending ON suggestions(source) WHERE status = 'pending'"
+        )
+        if legacy:
+            for suggestion in legacy:
+                self._insert(suggestion)
+            self.db.commit()
+            print(f"[Oracle] Imported {len(legacy)} suggestions from the JSON store")
+
+    def _read_legacy(self):
+        """Moves a JSON list written by older versions aside and returns its entries."""
+        try:
+            with open(self.path, 'rb') as f:
+                head = f.read(16)
+        except OSError:
+            return None
+        if head.startswith(b"SQLite format 3") or not head.lstrip().startswith(b"["):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except ValueError:
+            data = []
+        os.replace(self.path, f"{self.path}.json-legacy")
+        return data
+
+    def _insert(self, suggestion):
+        row = [suggestion.get(k) for k in FIELDS]
+        row[FIELDS.index("status")] = row[FIELDS.index("status")] or "pending"
+        row[FIELDS.index("action")] = row[FIELDS.index("action")] or "move"
+        cur = self.db.execute(
+            f"INSERT OR IGNORE INTO suggestions ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+            row
+        )
+        return cur.rowcount == 1
+
+    def add(self, suggestion):
+        """Stores a suggestion. Returns False if its source already has a pending one."""
+        with self.lock:
+            return self._insert(suggestion)
+
+    def has(self, source, status="pending"):
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM suggestions WHERE source = ? AND status = ? LIMIT 1", (source, status)
+            ).fetchone() is not None
+
+    def by_status(self, status="pending", limit=None):
+        """Suggestions with a status, newest first, as dicts (with their id)."""
+        query = f"SELECT id, {', '.join(FIELDS)} FROM suggestions WHERE status = ? ORDER BY timestamp DESC"
+        params = [status]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [dict(zip(("id",) + FIELDS, row)) for row in rows]
+
+    def set_status(self, suggestion_id, status):
+        with self.lock:
+            self.db.execute("UPDATE suggestions SET status = ? WHERE id = ?", (status, suggestion_id))
+            self.db.commit()
+
+    def recheck_duplicates(self, still_valid=None):
+        """
+        Marks pending "duplicate" suggestions stale once they no longer hold:
+        the source or the copy to keep (suggested_target) is gone, or either
+        changed (ctime, which cannot be set back) after the suggestion was made. still_valid(row, source_st,
+        target_st) may veto further (e.g. a hash check). Returns rows marked.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, source, suggested_target, timestamp FROM suggestions"
+                " WHERE status = 'pending' AND action = 'duplicate'"
+            ).fetchall()
+        stale = []
+        for row in rows:
+            suggestion_id, source, target, stamp = row
+            try:
+                source_st = os.stat(source)
+                target_st = os.stat(target)
+            except OSError:
+                stale.append((suggestion_id,))
+                continue
+            if max(source_st.st_ctime, target_st.st_ctime) > (stamp or 0):
+                stale.append((suggestion_id,))
+            elif still_valid is not None and not still_valid(row, source_st, target_st):
+                stale.append((suggestion_id,))
+        if stale:
+            with self.lock:
+                self.db.executemany("UPDATE suggestions SET status = 'stale' WHERE id = ?", stale)
+                self.db.commit()
+        return len(stale)
+
+    def counts(self):
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM suggestions GROUP BY status"))
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+
+    def compact(self, retention=RESOLVED_RETENTION):
+        """Drops resolved suggestions older than retention and returns the space. Returns rows removed."""
+        with self.lock:
+            cur = self.db.execute(
+                "DELETE FROM suggestions WHERE status != 'pending' AND timestamp < ?",
+                (time.time() - retention,)
+            )
+            self.db.commit()
+            if cur.rowcount:
+                self.db.execute("VACUUM")
+            return cur.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
@@ -8,6 +8,19 @@ import uuid
 import subprocess
 import time
 import pwd
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Import shared block device enumeration
+sys.path.append(os.path.join(os.path.dirname(__file__), '../core'))
+import blockdev
+import idcache
+import indexseed
+
+# [ CONSTANTS ]
+BATCH_JOBS = 4
 
 def check_root():
     if os.geteuid() != 0:
@@ -17,13 +30,9 @@ def check_root():
 
 def get_removable_drives():
     try:
-        # Request JSON output for specific columns
-        cmd = ["lsblk", "-J", "-o", "NAME,SIZE,MODEL,TRAN,MOUNTPOINT,FSTYPE"]
-        result = subprocess.check_output(cmd)
-        data = json.loads(result)
-        
+        # Same records lsblk -J would give, read from sysfs/udev directly
         candidates = []
-        for dev in data.get("blockdevices", []):
+        for dev in blockdev.scan(use_cache=False):
             # Filter out loop and zram devices
             if dev.get("name", "").startswith("loop") or dev.get("name", "").startswith("zram"):
                 continue
@@ -33,8 +42,19 @@ def get_removable_drives():
         print(f"Error scanning drives: {e}")
         return []
 
-def mint_drive(device_node, label, mountpoint):
-    """Initializes the ZenFS structure on the drive."""
+def system_users():
+    """All real users (UID >= 1000, excluding 'nobody' 65534)"""
+    return [u for u in pwd.getpwall() if u.pw_uid >= 1000 and u.pw_uid < 65534]
+
+def mint_drive(device_node, label, mountpoint, fs_uuid=None, seed_index=False, overwrite=None, users=None, foreign_cache=None):
+    """
+    Initializes the ZenFS structure on the drive. Returns the new drive UUID, or False.
+    With seed_index, also builds the drive's local index so its first attach
+    only has to check for changes.
+    overwrite: None asks before replacing an existing identity, True/False decide without asking.
+    users: passwd records to provision (default: all real users).
+    foreign_cache: shared ForeignDriveCache when minting several drives at once.
+    """
     
     target_path = mountpoint
     temp_mount = False
@@ -42,13 +62,13 @@ def mint_drive(device_node, label, mountpoint):
     # If not mounted, mount temporarily to write the structure
     if not mountpoint:
         print(f"Drive {device_node} is not mounted. Mounting temporarily...")
-        target_path = f"/tmp/zenfs_mint_{int(time.time())}"
-        os.makedirs(target_path, exist_ok=True)
+        target_path = tempfile.mkdtemp(prefix="zenfs_mint_")
         try:
             subprocess.check_call(["mount", f"/dev/{device_node}", target_path])
             temp_mount = True
         except subprocess.CalledProcessError:
             print("Failed to mount drive. Is it formatted?")
+            os.rmdir(target_path)
             return False
 
     # [ UPDATE ] New ZenFS Structure
@@ -59,10 +79,13 @@ def mint_drive(device_node, label, mountpoint):
     
     # Check for existing identity to prevent accidental wipes
     if os.path.exists(identity_file):
-        print(f"\n[!] WARNING: This drive already has a ZenFS identity!")
-        override = input("Overwrite? (y/N): ").lower()
-        if override != 'y':
-            if temp_mount: subprocess.call(["umount", target_path])
+        print(f"\n[!] WARNING: {device_node} already has a ZenFS identity!")
+        if overwrite is None:
+            overwrite = input("Overwrite? (y/N): ").lower() == 'y'
+        if not overwrite:
+            if temp_mount:
+                subprocess.call(["umount", target_path])
+                os.rmdir(target_path)
             return False
 
     # Create Structure
@@ -74,10 +97,7 @@ def mint_drive(device_node, label, mountpoint):
     # This ensures that all current system users have a writable folder on the new drive
     print("Provisioning user directories...")
     try:
-        # Get all real users (UID >= 1000, excluding 'nobody' 65534)
-        system_users = [u for u in pwd.getpwall() if u.pw_uid >= 1000 and u.pw_uid < 65534]
-        
-        for user in system_users:
+        for user in users if users is not None else system_users():
             user_path = os.path.join(users_dir, user.pw_name)
             if not os.path.exists(user_path):
                 print(f"  + Creating space for: {user.pw_name}")
@@ -90,6 +110,7 @@ def mint_drive(device_node, label, mountpoint):
         print(f"Warning: Failed to provision user directories: {e}")
 
     new_uuid = str(uuid.uuid4())
+    minted = False
     data = {
         "drive_identity": {
             "uuid": new_uuid,
@@ -102,10 +123,17 @@ def mint_drive(device_node, label, mountpoint):
     try:
         with open(identity_file, 'w') as f:
             json.dump(data, f, indent=2)
+        minted = True
+        # Nomad may have rejected this filesystem before it had an identity
+        if fs_uuid:
+            (foreign_cache or idcache.ForeignDriveCache()).forget(fs_uuid)
         print(f"\n[SUCCESS] Drive minted!")
         print(f"UUID:  {new_uuid}")
         print(f"Label: {label}")
         print(f"Path:  {identity_file}")
+        if seed_index:
+            print("Building drive index...")
+            indexseed.seed(target_path, new_uuid)
     except Exception as e:
         print(f"Error writing identity: {e}")
     finally:
@@ -113,9 +141,100 @@ def mint_drive(device_node, label, mountpoint):
             subprocess.call(["umount", target_path])
             os.rmdir(target_path)
     
-    return True
+    return new_uuid if minted else False
+
+def load_manifest(path):
+    """
+    Batch manifest: a JSON list (or {"drives": [...]}) of
+    {"device": "sdb1", "label": "...", "seed_index": bool, "overwrite": bool}.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    entries = data.get("drives", []) if isinstance(data, dict) else data
+    seen = set()
+    for entry in entries:
+        if not entry.get("device"):
+            raise ValueError(f"manifest entry without device: {entry}")
+        entry["device"] = os.path.basename(entry["device"])
+        # "/dev/sdb1" and "sdb1" are the same drive: two concurrent mints would race on it
+        if entry["device"] in seen:
+            raise ValueError(f"manifest lists device {entry['device']} more than once")
+        seen.add(entry["device"])
+    return entries
+
+def mint_batch(entries, jobs=BATCH_JOBS, seed_index=False):
+    """Mints manifest entries concurrently. Returns the report dict."""
+    started = time.time()
+    nodes = {d.get("name"): d for d in blockdev.flatten(blockdev.scan(use_cache=False))}
+    users = system_users()
+    foreign_cache = idcache.ForeignDriveCache()
+
+    def run(entry):
+        device = entry["device"]
+        result = {"device": device, "label": entry.get("label") or "Unnamed_ZenFS_Drive"}
+        node = nodes.get(device)
+        start = time.monotonic()
+        if node is None:
+            result.update(status="failed", error="device not found")
+        elif not node.get("fstype"):
+            result.update(status="failed", error="no filesystem")
+        else:
+            result["fs_uuid"] = node.get("uuid")
+            try:
+                drive_uuid = mint_drive(
+                    device, result["label"], node.get("mountpoint"), node.get("uuid"),
+                    seed_index=entry.get("seed_index", seed_index),
+                    overwrite=bool(entry.get("overwrite", False)), users=users,
+                    foreign_cache=foreign_cache
+                )
+                if drive_uuid:
+                    result.update(status="minted", uuid=drive_uuid)
+                else:
+                    result.update(status="failed", error="mint failed or identity exists")
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+        result["seconds"] = round(time.monotonic() - start, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = list(pool.map(run, entries))
+    return {
+        "started_at": started,
+        "seconds": round(time.time() - started, 3),
+        "minted": sum(1 for r in results if r["status"] == "minted"),
+        "failed": sum(1 for r in results if r["status"] != "minted"),
+        "drives": results
+    }
+
+def batch_main(args):
+    check_root()
+    try:
+        entries = load_manifest(args.batch)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest: {e}", file=sys.stderr)
+        sys.exit(2)
+    # Progress goes to stderr so stdout stays a clean JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = mint_batch(entries, args.jobs, args.seed_index)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    sys.exit(0 if report["failed"] == 0 else 1)
 
 def main():
+    parser = argparse.ArgumentParser(description="ZenFS Drive Minter")
+    parser.add_argument("--batch", metavar="MANIFEST", help="Mint the drives listed in a JSON manifest without prompting")
+    parser.add_argument("--jobs", type=int, default=BATCH_JOBS, help="Drives minted at once in batch mode")
+    parser.add_argument("--seed-index", action="store_true", help="Build the file index on each drive (manifest entries may override)")
+    parser.add_argument("--report", help="Write the batch report here instead of stdout")
+    args = parser.parse_args()
+    if args.batch:
+        batch_main(args)
+        return
+
     print("::: ZenFS Drive Minter :::")
     check_root()
     
@@ -167,8 +286,10 @@ def main():
             
         label = input(f"Enter Label for {dev['name']}: ")
         if not label: label = "Unnamed_ZenFS_Drive"
+
+        seed_index = input("Build the file index now (faster first attach)? (y/N): ").lower() == 'y'
             
-        mint_drive(dev['name'], label, dev.get('mountpoint'))
+        mint_drive(dev['name'], label, dev.get('mountpoint'), dev.get('uuid'), seed_index)
         
     except KeyboardInterrupt:
         print("\nAborted.")